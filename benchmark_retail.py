@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the data generator and the dashboard's hot paths.
+
+For each requested scale a dataset is generated into a temporary directory,
+then every step is timed and its peak resident memory recorded: generator
+sections, load_data, rollup construction, each filter path and each panel.
+Results are written as JSON so two runs can be compared:
+
+    python benchmark_retail.py --rows 10000 1000000 --output bench.json
+    python benchmark_retail.py --rows 1000000 --compare bench.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import generate_retail_data as gen
+from retail_analytics import DATASET_CACHES, FILTER_INDEPENDENT, PANEL_COLUMNS, PANELS, Filters, filter_facts
+from retail_data import load_dataset, required_columns, table_writer, write_table
+from retail_forecast import FrameHistory, fit_forecast
+from retail_rollups import build_rollups
+from retail_shared import SharedTables
+
+DEFAULT_ROWS = [10_000, 1_000_000]
+
+# Share of grid cells stocked by the inventory generator
+STOCKED_SHARE = 0.85
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (since the last reset, where supported)."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS counter so the next step reports its own peak (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class Recorder:
+    """Collects ``{step, seconds, peak_rss_mb}`` records for one scale."""
+
+    def __init__(self, repeat=1):
+        self.repeat = repeat
+        self.results = []
+
+    @contextmanager
+    def step(self, name):
+        reset_peak_rss()
+        started = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds, rss=None):
+        self.results.append({'step': name, 'seconds': seconds, 'peak_rss_mb': rss or peak_rss_mb()})
+        print(f"  {name:<32} {seconds * 1000:10.1f} ms  {self.results[-1]['peak_rss_mb']:8.0f} MB")
+
+    def time(self, name, func):
+        """Time ``func()`` ``repeat`` times, keeping the fastest run; returns its result."""
+        best, result = math.inf, None
+        reset_peak_rss()
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        self.add(name, best)
+        return result
+
+
+def scale_for_rows(rows, days=90):
+    """Pick a (stores, skus, days) grid producing roughly ``rows`` inventory rows."""
+    cells_per_day = rows / (STOCKED_SHARE * days)
+    stores = int(min(400, max(1, round(math.sqrt(cells_per_day / 50)))))
+    skus = max(len(gen.departments) * 3, round(cells_per_day / stores))
+    return stores, skus, days
+
+
+def bench_generator(recorder, data_dir, stores, skus, days, fmt, seed=42):
+    """Generate a dataset section by section, timing each generator stage."""
+    rng = gen.stream_rng(seed, gen.DIMENSION_STREAM)
+    with recorder.step('generate.dimensions'):
+        stores_df = gen.build_stores(stores, rng)
+        products_df = gen.build_products(skus, rng)
+        suppliers_df = gen.build_suppliers(rng)
+    date_range = pd.date_range('2024-06-01', periods=days, freq='D')
+
+    with recorder.step('generate.purchase_orders'):
+        po_df = gen.generate_purchase_orders(date_range, stores_df, products_df, gen.stream_rng(seed, gen.PO_STREAM))
+
+    for table, df in [('stores', stores_df), ('products', products_df),
+                      ('suppliers', suppliers_df), ('purchase_orders', po_df)]:
+        write_table(df, data_dir, table, fmt)
+
+    # Inventory and sales are generated and written day by day as in the
+    # generator, with time split between generation and writing
+    timings = dict.fromkeys(['generate.inventory', 'generate.sales', f'generate.write_{fmt}'], 0.0)
+    inventory_writer = table_writer(data_dir, 'inventory', fmt)
+    sales_writer = table_writer(data_dir, 'sales', fmt)
+    reset_peak_rss()
+    days_per_chunk = max(1, gen.DEFAULT_CHUNK_ROWS // (stores * skus))
+    for start in range(0, days, days_per_chunk):
+        day_indices = range(start, min(start + days_per_chunk, days))
+        t0 = time.perf_counter()
+        inventory = pd.concat([gen.inventory_block(date_range[d:d + 1], stores_df, products_df,
+                                                   gen.stream_rng(seed, gen.INVENTORY_STREAM, d))
+                               for d in day_indices], ignore_index=True)
+        t1 = time.perf_counter()
+        sales = pd.concat([gen.sales_block(date_range[d:d + 1], stores_df, products_df,
+                                           gen.stream_rng(seed, gen.SALES_STREAM, d))
+                           for d in day_indices], ignore_index=True)
+        t2 = time.perf_counter()
+        inventory_writer.write(inventory)
+        sales_writer.write(gen.assign_transaction_ids(sales, 10000 + sales_writer.rows))
+        t3 = time.perf_counter()
+        timings['generate.inventory'] += t1 - t0
+        timings['generate.sales'] += t2 - t1
+        timings[f'generate.write_{fmt}'] += t3 - t2
+    rss = peak_rss_mb()
+    for name, seconds in timings.items():
+        recorder.add(name, seconds, rss)
+    return inventory_writer.rows, sales_writer.rows
+
+
+def clear_dataset_caches():
+    """Forget everything memoized on the dataset, so every timed run of a filter or panel starts cold."""
+    for cache in DATASET_CACHES:
+        cache.cache_clear()
+
+
+def bench_dashboard(recorder, data_dir, fmt):
+    """Time load_data, rollups, each filter path and each panel on a generated dataset."""
+    columns = required_columns(PANEL_COLUMNS)
+    data = recorder.time(f'load_data.{fmt}', lambda: load_dataset(data_dir, columns=columns, fmt=fmt))
+    rollups = recorder.time('build_rollups', lambda: build_rollups(data))
+    with recorder.step('build_inventory_sums'):
+        rollups.inventory_sums
+    shared = SharedTables(Path(data_dir) / 'retail_shared')
+    with recorder.step('shared.publish'):
+        shared.publish('benchmark', data, rollups)
+    recorder.time('shared.open', lambda: shared.open('benchmark'))
+    recorder.time('forecast.fit', lambda: fit_forecast(FrameHistory(data), data.products))
+
+    last_day = data.inventory_index.days[-1].item()
+    month = (last_day - timedelta(days=30), last_day)
+    store_id = data.stores['store_id'].iloc[0]
+    department = str(data.products['department'].iloc[0])
+    regions = data.stores['region'].unique()[:2]
+    categories = data.products['category'].unique()[:3]
+    filter_sets = {
+        'all': Filters(),
+        'last_30_days': Filters(*month),
+        'store': Filters(*month, store_ids=[store_id]),
+        'department': Filters(*month, departments=[department]),
+        'store_department': Filters(*month, store_ids=[store_id], departments=[department]),
+        'regions_categories': Filters(*month, regions=regions, categories=categories)
+    }
+
+    for label, filters in filter_sets.items():
+        def run_filter(filters=filters):
+            clear_dataset_caches()
+            return filter_facts(data, filters)
+        recorder.time(f'filter.{label}', run_filter)
+
+    for label in ('all', 'last_30_days', 'store_department'):
+        filters = filter_sets[label]
+        for name, panel in PANELS.items():
+            if name in FILTER_INDEPENDENT and label != 'all':
+                continue
+            def run_panel(panel=panel, filters=filters):
+                clear_dataset_caches()
+                return panel(data, rollups, filters)
+            recorder.time(f'panel.{name}.{label}', run_panel)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform()
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print steps whose time regressed more than ``threshold`` versus a baseline JSON file."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    base_times = {(scale['rows'], r['step']): r['seconds'] for scale in baseline['scales'] for r in scale['results']}
+
+    regressions = []
+    print(f"\nComparison against {baseline_path}:")
+    for scale in results['scales']:
+        for r in scale['results']:
+            before = base_times.get((scale['rows'], r['step']))
+            if not before:
+                continue
+            ratio = r['seconds'] / before
+            flag = 'REGRESSION' if ratio > 1 + threshold else ''
+            print(f"  {scale['rows']:>12,} {r['step']:<32} {before * 1000:10.1f} -> {r['seconds'] * 1000:10.1f} ms"
+                  f"  x{ratio:5.2f} {flag}")
+            if flag:
+                regressions.append((scale['rows'], r['step'], ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the generator and dashboard computations.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="approximate inventory rows per scale (default: 10000 1000000)")
+    parser.add_argument('--days', type=int, default=90, help="days of history per dataset (default: 90)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='parquet',
+                        help="storage format benchmarked for load_data (default: parquet)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per dashboard step, fastest kept (default: 3)")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON results file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {'environment': environment(), 'format': args.format, 'scales': []}
+
+    for rows in args.rows:
+        stores, skus, days = scale_for_rows(rows, args.days)
+        print(f"\n=== ~{rows:,} inventory rows: {stores} stores x {skus} SKUs x {days} days ===")
+        recorder = Recorder(args.repeat)
+        with tempfile.TemporaryDirectory(prefix='retail_bench_') as data_dir:
+            inventory_rows, sales_rows = bench_generator(recorder, data_dir, stores, skus, days, args.format)
+            bench_dashboard(recorder, data_dir, args.format)
+        results['scales'].append({
+            'rows': rows, 'stores': stores, 'skus': skus, 'days': days,
+            'inventory_rows': inventory_rows, 'sales_rows': sales_rows,
+            'results': recorder.results
+        })
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {Path(args.output).resolve()}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,27 +5,32 @@ Created on Wed Dec  3 11:25:12 2025
 @author: alexy
 """
 
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-np.random.seed(42)
+from retail_data import FORMATS, STATUS_LEVELS, TABLES, table_path, table_writer, write_table
 
 # ========== STORE LOCATIONS ==========
 stores_data = {
     'store_id': ['ST001', 'ST002', 'ST003', 'ST004', 'ST005', 'ST006', 'ST007', 'ST008'],
     'store_name': ['Downtown Flagship', 'West Side Mall', 'Airport Plaza', 'Suburban Center',
                    'Harbor View', 'Tech District', 'University Square', 'Riverside Outlet'],
-    'city': ['Seattle', 'Portland', 'San Francisco', 'Los Angeles', 
+    'city': ['Seattle', 'Portland', 'San Francisco', 'Los Angeles',
              'San Diego', 'Austin', 'Denver', 'Phoenix'],
     'state': ['WA', 'OR', 'CA', 'CA', 'CA', 'TX', 'CO', 'AZ'],
     'region': ['Northwest', 'Northwest', 'West', 'West', 'West', 'South', 'Mountain', 'Southwest'],
     'store_type': ['Flagship', 'Standard', 'Airport', 'Standard', 'Standard', 'Standard', 'Standard', 'Outlet'],
     'size_sqft': [15000, 8000, 5000, 10000, 9000, 8500, 7000, 12000],
-    'opening_date': ['2018-03-15', '2019-06-01', '2020-01-10', '2017-09-20', 
+    'opening_date': ['2018-03-15', '2019-06-01', '2020-01-10', '2017-09-20',
                      '2019-11-15', '2020-05-01', '2018-08-10', '2021-02-01']
 }
-stores_df = pd.DataFrame(stores_data)
 
 # ========== PRODUCT HIERARCHY ==========
 departments = {
@@ -35,224 +40,683 @@ departments = {
     'Outdoor': ['Garden', 'Patio', 'BBQ & Grills']
 }
 
-products_list = []
-sku_counter = 1000
-
-for dept, categories in departments.items():
-    for category in categories:
-        # Create 3-5 products per category
-        num_products = np.random.randint(3, 6)
-        for i in range(num_products):
-            sku = f'SKU{sku_counter:05d}'
-            sku_counter += 1
-            
-            # Generate realistic product attributes
-            base_cost = np.random.uniform(20, 800)
-            markup = np.random.uniform(1.3, 2.5)
-            retail_price = round(base_cost * markup, 2)
-            
-            products_list.append({
-                'sku': sku,
-                'department': dept,
-                'category': category,
-                'product_name': f'{category} Item {i+1}',
-                'supplier_id': f'SUP{np.random.randint(1, 15):03d}',
-                'cost': round(base_cost, 2),
-                'retail_price': retail_price,
-                'reorder_point': np.random.randint(10, 50),
-                'reorder_quantity': np.random.randint(20, 100),
-                'lead_time_days': np.random.randint(7, 45),
-                'shelf_life_days': np.random.choice([None, 180, 365, 730]),
-                'weight_kg': round(np.random.uniform(0.5, 25), 2),
-                'is_seasonal': np.random.choice([True, False], p=[0.3, 0.7])
-            })
+# Upper bound on rows held in memory per output chunk; the inventory engine
+# also uses it to size its date x store x SKU blocks.
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def build_stores(n_stores, rng):
+    """Return the store dimension, synthesizing extra locations past the base 8."""
+    stores_df = pd.DataFrame(stores_data)
+    if n_stores <= len(stores_df):
+        return stores_df.head(n_stores).reset_index(drop=True)
+
+    # Extra stores reuse the base cities so region/state stay consistent
+    n_extra = n_stores - len(stores_df)
+    numbers = np.arange(len(stores_df) + 1, n_stores + 1)
+    base = stores_df.iloc[rng.integers(0, len(stores_df), n_extra)].reset_index(drop=True)
+    opening = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3000, n_extra), unit='D')
+
+    extra_df = pd.DataFrame({
+        'store_id': [f'ST{n:03d}' for n in numbers],
+        'store_name': [f'{city} Store {n}' for city, n in zip(base['city'], numbers)],
+        'city': base['city'],
+        'state': base['state'],
+        'region': base['region'],
+        'store_type': rng.choice(['Standard', 'Flagship', 'Outlet', 'Airport'], n_extra, p=[0.6, 0.15, 0.15, 0.1]),
+        'size_sqft': rng.integers(10, 31, n_extra) * 500,
+        'opening_date': opening.strftime('%Y-%m-%d')
+    })
+    return pd.concat([stores_df, extra_df], ignore_index=True)
+
+
+def build_products(n_skus, rng):
+    """Return the product catalog.
 
-products_df = pd.DataFrame(products_list)
-
-# ========== SUPPLIERS ==========
-suppliers_data = []
-for i in range(1, 15):
-    suppliers_data.append({
-        'supplier_id': f'SUP{i:03d}',
-        'supplier_name': f'Supplier {i} Inc.',
-        'country': np.random.choice(['USA', 'China', 'Germany', 'Japan', 'South Korea'], p=[0.4, 0.3, 0.1, 0.1, 0.1]),
-        'reliability_score': round(np.random.uniform(75, 99), 1),
-        'avg_lead_time': np.random.randint(14, 60),
-        'defect_rate': round(np.random.uniform(0.1, 5.0), 2)
+    With ``n_skus=None`` each category gets 3-5 products as before; otherwise
+    ``n_skus`` products are spread evenly over the categories.
+    """
+    categories = [(dept, category) for dept, cats in departments.items() for category in cats]
+
+    if n_skus is None:
+        per_category = rng.integers(3, 6, len(categories))
+    else:
+        per_category = np.full(len(categories), n_skus // len(categories))
+        per_category[:n_skus % len(categories)] += 1
+
+    n = int(per_category.sum())
+    cat_idx = np.repeat(np.arange(len(categories)), per_category)
+    # 1-based item number within each category
+    item_no = np.arange(n) - np.repeat(np.cumsum(per_category) - per_category, per_category) + 1
+
+    # Generate realistic product attributes
+    base_cost = rng.uniform(20, 800, n)
+    markup = rng.uniform(1.3, 2.5, n)
+
+    return pd.DataFrame({
+        'sku': [f'SKU{1000 + i:05d}' for i in range(n)],
+        'department': [categories[c][0] for c in cat_idx],
+        'category': [categories[c][1] for c in cat_idx],
+        'product_name': [f'{categories[c][1]} Item {i}' for c, i in zip(cat_idx, item_no)],
+        'supplier_id': [f'SUP{s:03d}' for s in rng.integers(1, 15, n)],
+        'cost': np.round(base_cost, 2),
+        'retail_price': np.round(base_cost * markup, 2),
+        'reorder_point': rng.integers(10, 50, n),
+        'reorder_quantity': rng.integers(20, 100, n),
+        'lead_time_days': rng.integers(7, 45, n),
+        'shelf_life_days': np.array([np.nan, 180, 365, 730])[rng.integers(0, 4, n)],
+        'weight_kg': np.round(rng.uniform(0.5, 25, n), 2),
+        'is_seasonal': rng.random(n) < 0.3
     })
-suppliers_df = pd.DataFrame(suppliers_data)
+
+
+def build_suppliers(rng):
+    suppliers_data = []
+    for i in range(1, 15):
+        suppliers_data.append({
+            'supplier_id': f'SUP{i:03d}',
+            'supplier_name': f'Supplier {i} Inc.',
+            'country': rng.choice(['USA', 'China', 'Germany', 'Japan', 'South Korea'], p=[0.4, 0.3, 0.1, 0.1, 0.1]),
+            'reliability_score': round(rng.uniform(75, 99), 1),
+            'avg_lead_time': rng.integers(14, 60),
+            'defect_rate': round(rng.uniform(0.1, 5.0), 2)
+        })
+    return pd.DataFrame(suppliers_data)
+
 
 # ========== DAILY INVENTORY SNAPSHOTS ==========
-# Generate 180 days of inventory data
-start_date = datetime(2024, 6, 1)
-end_date = datetime(2024, 11, 27)
-date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-
-inventory_records = []
-
-for date in date_range:
-    for _, store in stores_df.iterrows():
-        for _, product in products_df.iterrows():
-            # Not all products in all stores
-            if np.random.random() < 0.85:  # 85% chance product is stocked
-                
-                # Initialize or carry forward inventory
-                base_stock = np.random.randint(5, 150)
-                
-                # Add seasonality
-                month = date.month
-                seasonal_factor = 1.0
-                if product['is_seasonal']:
-                    if month in [11, 12]:  # Holiday season
-                        seasonal_factor = 1.5
-                    elif month in [6, 7, 8]:  # Summer
-                        seasonal_factor = 1.3
-                
-                # Daily sales with variation
-                avg_daily_sales = np.random.uniform(2, 15) * seasonal_factor
-                daily_sales = max(0, int(np.random.poisson(avg_daily_sales)))
-                
-                current_stock = max(0, base_stock - daily_sales)
-                
-                # Determine status
-                if current_stock == 0:
-                    status = 'Out of Stock'
-                elif current_stock <= product['reorder_point']:
-                    status = 'Low Stock'
-                elif current_stock > product['reorder_quantity'] * 1.5:
-                    status = 'Overstock'
-                else:
-                    status = 'In Stock'
-                
-                # Calculate days of supply
-                days_supply = int(current_stock / avg_daily_sales) if avg_daily_sales > 0 else 999
-                
-                inventory_records.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'store_id': store['store_id'],
-                    'sku': product['sku'],
-                    'quantity_on_hand': current_stock,
-                    'quantity_sold': daily_sales,
-                    'status': status,
-                    'days_of_supply': min(days_supply, 999),
-                    'value_on_hand': round(current_stock * product['cost'], 2)
-                })
-
-inventory_df = pd.DataFrame(inventory_records)
+def seasonal_factors(dates, is_seasonal):
+    """Return a (days, skus) demand multiplier: holiday 1.5x, summer 1.3x for seasonal SKUs."""
+    month = dates.month.to_numpy()
+    season = np.select([np.isin(month, [11, 12]), np.isin(month, [6, 7, 8])], [1.5, 1.3], 1.0)
+    return np.where(is_seasonal[None, :], season[:, None], 1.0)
+
+
+def inventory_block(dates, stores_df, products_df, rng):
+    """Generate snapshots for a block of dates over the full date x store x SKU grid.
+
+    Every draw is made in bulk for the stocked cells of the grid, so cost is
+    proportional to the number of rows emitted rather than to Python-level
+    iterations.
+    """
+    shape = (len(dates), len(stores_df), len(products_df))
+
+    # Not all products in all stores (85% chance product is stocked)
+    cells = np.flatnonzero(rng.random(shape) < 0.85)
+    day_idx, store_idx, sku_idx = np.unravel_index(cells, shape)
+    n = cells.size
+
+    base_stock = rng.integers(5, 150, n)
+
+    # Daily sales with variation and seasonality
+    factor = seasonal_factors(dates, products_df['is_seasonal'].to_numpy(bool))[day_idx, sku_idx]
+    avg_daily_sales = rng.uniform(2, 15, n) * factor
+    daily_sales = rng.poisson(avg_daily_sales)
+
+    current_stock = np.maximum(0, base_stock - daily_sales)
+
+    return inventory_rows(dates, day_idx, store_idx, sku_idx, current_stock, daily_sales, avg_daily_sales,
+                          stores_df, products_df)
+
+
+def inventory_rows(dates, day_idx, store_idx, sku_idx, current_stock, daily_sales, avg_daily_sales,
+                   stores_df, products_df):
+    """Build snapshot rows from end-of-day stock, units sold and expected daily sales per cell."""
+    # Determine status
+    reorder_point = products_df['reorder_point'].to_numpy()[sku_idx]
+    reorder_quantity = products_df['reorder_quantity'].to_numpy()[sku_idx]
+    status = np.select(
+        [current_stock == 0, current_stock <= reorder_point, current_stock > reorder_quantity * 1.5],
+        [STATUS_LEVELS.index('Out of Stock'), STATUS_LEVELS.index('Low Stock'), STATUS_LEVELS.index('Overstock')],
+        STATUS_LEVELS.index('In Stock')
+    )
+
+    # Calculate days of supply
+    days_supply = np.minimum((current_stock / avg_daily_sales).astype(np.int64), 999)
+
+    cost = products_df['cost'].to_numpy()[sku_idx]
+
+    return pd.DataFrame({
+        'date': dates.to_numpy()[day_idx],
+        'store_id': pd.Categorical.from_codes(store_idx, stores_df['store_id']),
+        'sku': pd.Categorical.from_codes(sku_idx, products_df['sku']),
+        'quantity_on_hand': current_stock,
+        'quantity_sold': daily_sales,
+        'status': pd.Categorical.from_codes(status, STATUS_LEVELS),
+        'days_of_supply': days_supply,
+        'value_on_hand': np.round(current_stock * cost, 2)
+    })
+
 
 # ========== SALES TRANSACTIONS ==========
-sales_records = []
-transaction_id = 10000
-
-for date in date_range:
-    daily_transactions = np.random.randint(50, 200)  # 50-200 transactions per day
-    
-    for _ in range(daily_transactions):
-        store = stores_df.sample(1).iloc[0]
-        
-        # 1-3 items per transaction
-        num_items = np.random.choice([1, 2, 3], p=[0.6, 0.3, 0.1])
-        
-        for _ in range(num_items):
-            product = products_df.sample(1).iloc[0]
-            quantity = np.random.choice([1, 1, 1, 2, 2, 3], p=[0.5, 0.2, 0.15, 0.08, 0.05, 0.02])
-            
-            # Apply occasional discounts
-            discount = 0
-            if np.random.random() < 0.15:  # 15% chance of discount
-                discount = round(product['retail_price'] * np.random.uniform(0.1, 0.3), 2)
-            
-            final_price = product['retail_price'] - discount
-            revenue = round(quantity * final_price, 2)
-            profit = round(revenue - (quantity * product['cost']), 2)
-            
-            sales_records.append({
-                'transaction_id': f'TXN{transaction_id:08d}',
-                'date': date.strftime('%Y-%m-%d'),
+# 1-3 items per transaction, mostly single units per line
+BASKET_SIZES, BASKET_P = [1, 2, 3], [0.6, 0.3, 0.1]
+QUANTITIES, QUANTITY_P = [1, 1, 1, 2, 2, 3], [0.5, 0.2, 0.15, 0.08, 0.05, 0.02]
+
+
+def daily_transaction_bounds(n_stores):
+    """Return the [low, high) range of daily transactions, 50-200 per 8 stores."""
+    scale = n_stores / len(stores_data['store_id'])
+    low = max(1, round(50 * scale))
+    return low, max(low + 1, round(200 * scale))
+
+
+def format_ids(prefix, numbers, width):
+    """Vectorized ``f'{prefix}{n:0{width}d}'`` over an integer array."""
+    return prefix + pd.Series(numbers).astype(str).str.zfill(width)
+
+
+def sales_lines(day_idx, store_idx, sku_idx, dates, stores_df, products_df, rng, quantity=None):
+    """Price a batch of sales line items column-wise.
+
+    Discounts, revenue, cost, profit and margin are computed on whole arrays;
+    ``quantity`` is drawn from the usual line-size distribution when not given.
+    Transaction ids are assigned later by ``assign_transaction_ids`` so that
+    partitions generated independently can be numbered in date order.
+    """
+    n = len(sku_idx)
+    if quantity is None:
+        quantity = rng.choice(QUANTITIES, n, p=QUANTITY_P)
+
+    retail_price = products_df['retail_price'].to_numpy()[sku_idx]
+    unit_cost = products_df['cost'].to_numpy()[sku_idx]
+
+    # Apply occasional discounts (15% chance, 10-30% off)
+    discounted = rng.random(n) < 0.15
+    discount = np.where(discounted, np.round(retail_price * rng.uniform(0.1, 0.3, n), 2), 0.0)
+
+    revenue = np.round(quantity * (retail_price - discount), 2)
+    profit = np.round(revenue - quantity * unit_cost, 2)
+    profit_margin = np.round(np.divide(profit * 100, revenue, out=np.zeros(n), where=revenue > 0), 2)
+
+    return pd.DataFrame({
+        'date': dates.to_numpy()[day_idx],
+        'store_id': pd.Categorical.from_codes(store_idx, stores_df['store_id']),
+        'sku': pd.Categorical.from_codes(sku_idx, products_df['sku']),
+        'quantity': quantity,
+        'unit_price': retail_price,
+        'discount': discount,
+        'revenue': revenue,
+        'cost': np.round(quantity * unit_cost, 2),
+        'profit': profit,
+        'profit_margin': profit_margin
+    })
+
+
+def sales_block(dates, stores_df, products_df, rng):
+    """Generate every sales line item for a block of dates in one batch.
+
+    Transaction counts, basket sizes, stores and SKUs are drawn as arrays and
+    expanded with ``np.repeat``; nothing is sampled row by row.
+    """
+    low, high = daily_transaction_bounds(len(stores_df))
+    daily_transactions = rng.integers(low, high, len(dates))
+
+    n_transactions = int(daily_transactions.sum())
+    transaction_day = np.repeat(np.arange(len(dates)), daily_transactions)
+    transaction_store = rng.integers(0, len(stores_df), n_transactions)
+    num_items = rng.choice(BASKET_SIZES, n_transactions, p=BASKET_P)
+
+    day_idx = np.repeat(transaction_day, num_items)
+    store_idx = np.repeat(transaction_store, num_items)
+    sku_idx = rng.integers(0, len(products_df), len(day_idx))
+
+    return sales_lines(day_idx, store_idx, sku_idx, dates, stores_df, products_df, rng)
+
+
+# Mean units per sales line under the line-size distribution
+MEAN_LINE_QUANTITY = float(np.dot(QUANTITIES, QUANTITY_P))
+
+
+def split_quantities(quantity, rng):
+    """Split each cell's units sold into sales lines of at least one unit.
+
+    A cell selling ``q`` units gets ``1 + Binomial(q - 1, 1 / MEAN_LINE_QUANTITY)``
+    lines, and the units beyond one per line are spread over its lines
+    multinomially (each lands on a uniformly drawn line), so lines are mostly
+    single units and always add back up to ``q``. Returns the cell of each
+    line and its quantity.
+    """
+    quantity = np.asarray(quantity, dtype=np.int64)
+    cells = np.arange(len(quantity))
+    lines = np.where(quantity > 0, 1 + rng.binomial(np.maximum(quantity - 1, 0), 1 / MEAN_LINE_QUANTITY), 0)
+    first_line = np.cumsum(lines) - lines
+
+    unit_cell = np.repeat(cells, quantity - lines)
+    unit_line = first_line[unit_cell] + (rng.random(len(unit_cell)) * lines[unit_cell]).astype(np.int64)
+    return np.repeat(cells, lines), 1 + np.bincount(unit_line, minlength=int(lines.sum()))
+
+
+def reconciled_sales(day_idx, store_idx, sku_idx, quantity_sold, dates, stores_df, products_df, rng):
+    """Sales lines that add up exactly to ``quantity_sold`` per date x store x SKU cell."""
+    cell, quantity = split_quantities(quantity_sold, rng)
+    return sales_lines(day_idx[cell], store_idx[cell], sku_idx[cell], dates, stores_df, products_df, rng,
+                       quantity=quantity)
+
+
+def assign_transaction_ids(sales_df, first_transaction_id):
+    """Prepend sequential ``TXN`` ids starting at ``first_transaction_id``."""
+    ids = np.arange(first_transaction_id, first_transaction_id + len(sales_df))
+    sales_df.insert(0, 'transaction_id', format_ids('TXN', ids, 8).to_numpy())
+    return sales_df
+
+
+# ========== PURCHASE ORDERS ==========
+def generate_purchase_orders(date_range, stores_df, products_df, rng):
+    po_records = []
+    po_id = 5000
+
+    # Generate purchase orders for restocking
+    for date in date_range[::7]:  # Weekly POs
+        num_pos = rng.integers(5, 15)
+
+        for _ in range(num_pos):
+            product = products_df.sample(1, random_state=rng).iloc[0]
+            store = stores_df.sample(1, random_state=rng).iloc[0]
+
+            order_quantity = product['reorder_quantity']
+            unit_cost = product['cost']
+            total_cost = round(order_quantity * unit_cost, 2)
+
+            delivery_date = date + timedelta(days=int(product['lead_time_days']))
+
+            # PO status
+            if delivery_date < datetime.now():
+                po_status = rng.choice(['Delivered', 'Delivered', 'Delivered', 'Partially Delivered'],
+                                       p=[0.85, 0.1, 0.03, 0.02])
+            else:
+                po_status = 'In Transit'
+
+            po_records.append({
+                'po_number': f'PO{po_id:06d}',
+                'order_date': date.strftime('%Y-%m-%d'),
+                'expected_delivery': delivery_date.strftime('%Y-%m-%d'),
                 'store_id': store['store_id'],
                 'sku': product['sku'],
-                'quantity': quantity,
-                'unit_price': product['retail_price'],
-                'discount': discount,
-                'revenue': revenue,
-                'cost': round(quantity * product['cost'], 2),
-                'profit': profit,
-                'profit_margin': round((profit / revenue * 100), 2) if revenue > 0 else 0
+                'supplier_id': product['supplier_id'],
+                'order_quantity': order_quantity,
+                'unit_cost': unit_cost,
+                'total_cost': total_cost,
+                'status': po_status
             })
-            transaction_id += 1
+            po_id += 1
 
-sales_df = pd.DataFrame(sales_records)
+    return pd.DataFrame(po_records)
 
-# ========== PURCHASE ORDERS ==========
-po_records = []
-po_id = 5000
-
-# Generate purchase orders for restocking
-for date in date_range[::7]:  # Weekly POs
-    num_pos = np.random.randint(5, 15)
-    
-    for _ in range(num_pos):
-        product = products_df.sample(1).iloc[0]
-        store = stores_df.sample(1).iloc[0]
-        
-        order_quantity = product['reorder_quantity']
-        unit_cost = product['cost']
-        total_cost = round(order_quantity * unit_cost, 2)
-        
-        delivery_date = date + timedelta(days=int(product['lead_time_days']))
-        
-        # PO status
-        if delivery_date < datetime.now():
-            po_status = np.random.choice(['Delivered', 'Delivered', 'Delivered', 'Partially Delivered'], 
-                                        p=[0.85, 0.1, 0.03, 0.02])
+
+# ========== PARALLEL GENERATION ==========
+# Every day gets its own RNG stream per table, keyed like the children of
+# SeedSequence(seed).spawn(), so the rows for a day do not depend on how the
+# date range is partitioned or how many worker processes generate it.
+DIMENSION_STREAM, INVENTORY_STREAM, SALES_STREAM, PO_STREAM = range(4)
+
+
+def stream_rng(seed, *key):
+    """Return the Generator for the independent stream ``key`` under ``seed``."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def generate_days(seed, date_range, stores_df, products_df, day_indices, reconcile=False):
+    """Generate the inventory and sales rows for a partition of days.
+
+    With ``reconcile`` the sales lines are split from each snapshot's
+    ``quantity_sold`` instead of being drawn independently.
+    """
+    inventory, sales = [], []
+    for day in day_indices:
+        dates = date_range[day:day + 1]
+        snapshots = inventory_block(dates, stores_df, products_df, stream_rng(seed, INVENTORY_STREAM, day))
+        rng = stream_rng(seed, SALES_STREAM, day)
+        if reconcile:
+            sales.append(reconciled_sales(
+                np.zeros(len(snapshots), dtype=np.int64), snapshots['store_id'].cat.codes.to_numpy(),
+                snapshots['sku'].cat.codes.to_numpy(), snapshots['quantity_sold'].to_numpy(),
+                dates, stores_df, products_df, rng))
         else:
-            po_status = 'In Transit'
-        
-        po_records.append({
-            'po_number': f'PO{po_id:06d}',
-            'order_date': date.strftime('%Y-%m-%d'),
-            'expected_delivery': delivery_date.strftime('%Y-%m-%d'),
-            'store_id': store['store_id'],
-            'sku': product['sku'],
-            'supplier_id': product['supplier_id'],
-            'order_quantity': order_quantity,
+            sales.append(sales_block(dates, stores_df, products_df, rng))
+        inventory.append(snapshots)
+    return pd.concat(inventory, ignore_index=True), pd.concat(sales, ignore_index=True)
+
+
+_worker_context = None
+
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+
+
+def _generate_partition(day_indices, reconcile=False):
+    return generate_days(*_worker_context, day_indices, reconcile)
+
+
+def iter_partitions(seed, date_range, stores_df, products_df, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1,
+                    reconcile=False):
+    """Yield ``(inventory_df, sales_df)`` per partition of whole days, in date order.
+
+    Partitions hold about ``chunk_rows`` inventory rows (never less than one
+    day). With ``workers > 1`` they are generated by a process pool with at
+    most two partitions per worker in flight, so memory stays bounded.
+    """
+    days_per_partition = max(1, chunk_rows // (len(stores_df) * len(products_df)))
+    partitions = [range(start, min(start + days_per_partition, len(date_range)))
+                  for start in range(0, len(date_range), days_per_partition)]
+    context = (seed, date_range, stores_df, products_df)
+
+    if workers <= 1:
+        for day_indices in partitions:
+            yield generate_days(*context, day_indices, reconcile)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(context,)) as pool:
+        pending = deque()
+        for day_indices in partitions:
+            pending.append(pool.submit(_generate_partition, day_indices, reconcile))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ========== STOCK SIMULATION ==========
+# In --simulate mode stock is carried from day to day: each store x SKU has a
+# fixed mean demand, sells at most what it has on hand, and is replenished by
+# purchase orders raised when its inventory position, less the demand expected
+# over the lead time, reaches the reorder point. Stores are simulated in
+# shards of about SHARD_PAIRS cells; the shard layout does not depend on the
+# worker count, so neither does the output.
+SIM_STREAM = 4
+SHARD_PAIRS = 250_000
+
+
+@dataclass
+class StoreShard:
+    """Carried-over stock state of a contiguous range of stores, as dense (stores, skus) arrays."""
+    number: int
+    lo: int
+    hi: int
+    stocked: np.ndarray
+    mean_demand: np.ndarray
+    on_hand: np.ndarray
+    on_order: np.ndarray
+    # Open purchase orders: day index due, flat cell in the shard, quantity
+    due: np.ndarray
+    cell: np.ndarray
+    quantity: np.ndarray
+
+
+def init_shard(seed, number, lo, hi, products_df):
+    """Draw the assortment, mean demand and opening stock of stores ``lo``..``hi``."""
+    rng = stream_rng(seed, SIM_STREAM, number)
+    shape = (hi - lo, len(products_df))
+    stocked = rng.random(shape) < 0.85
+    mean_demand = np.where(stocked, rng.uniform(2, 15, shape), 0.0)
+
+    # Open somewhere inside a replenishment cycle so reorders are staggered
+    lead_demand = np.ceil(mean_demand * products_df['lead_time_days'].to_numpy())
+    cycle = rng.integers(0, products_df['reorder_quantity'].to_numpy() + 1, shape)
+    on_hand = np.where(stocked, products_df['reorder_point'].to_numpy() + lead_demand + cycle, 0).astype(np.int64)
+
+    empty = np.empty(0, dtype=np.int64)
+    return StoreShard(number, lo, hi, stocked, mean_demand, on_hand, np.zeros(shape, dtype=np.int64),
+                      empty, empty, empty)
+
+
+def simulate_days(seed, date_range, stores_df, products_df, shard, day_indices):
+    """Step ``shard`` through consecutive days.
+
+    Returns the inventory and sales rows, the purchase orders raised as
+    ``(order day, store, sku, quantity, due day)`` arrays, and the shard's
+    state after the last day.
+    """
+    n_skus = len(products_df)
+    reorder_point = products_df['reorder_point'].to_numpy()
+    lead_time = products_df['lead_time_days'].to_numpy()
+    order_up_to = products_df['reorder_quantity'].to_numpy() + np.ceil(shard.mean_demand * lead_time).astype(np.int64)
+    factors = seasonal_factors(date_range[day_indices[0]:day_indices[-1] + 1],
+                               products_df['is_seasonal'].to_numpy(bool))
+    on_hand, on_order = shard.on_hand.copy(), shard.on_order.copy()
+    due, cell, quantity = shard.due, shard.cell, shard.quantity
+
+    inventory, sales, orders = [], [], []
+    for offset, day in enumerate(day_indices):
+        rng = stream_rng(seed, INVENTORY_STREAM, day, shard.number)
+        dates = date_range[day:day + 1]
+
+        # Receive the orders due today
+        arriving = due == day
+        np.add.at(on_hand.reshape(-1), cell[arriving], quantity[arriving])
+        np.add.at(on_order.reshape(-1), cell[arriving], -quantity[arriving])
+        due, cell, quantity = due[~arriving], cell[~arriving], quantity[~arriving]
+
+        # Sell what demand asks for, up to the stock on hand
+        expected = shard.mean_demand * factors[offset]
+        sold = np.minimum(rng.poisson(expected), on_hand)
+        on_hand -= sold
+
+        # Reorder up to cover the lead time once the projected position hits the reorder point
+        raise_order = shard.stocked & (on_hand + on_order - shard.mean_demand * lead_time <= reorder_point)
+        store_idx, sku_idx = np.nonzero(raise_order)
+        new_quantity = order_up_to[store_idx, sku_idx]
+        on_order[store_idx, sku_idx] += new_quantity
+        due = np.concatenate([due, day + lead_time[sku_idx]])
+        cell = np.concatenate([cell, store_idx * n_skus + sku_idx])
+        quantity = np.concatenate([quantity, new_quantity])
+        orders.append((np.full(len(sku_idx), day), shard.lo + store_idx, sku_idx, new_quantity, day + lead_time[sku_idx]))
+
+        store_idx, sku_idx = np.nonzero(shard.stocked)
+        day_idx = np.zeros(len(sku_idx), dtype=np.int64)
+        inventory.append(inventory_rows(dates, day_idx, shard.lo + store_idx, sku_idx, on_hand[store_idx, sku_idx],
+                                        sold[store_idx, sku_idx], expected[store_idx, sku_idx], stores_df, products_df))
+
+        # Every unit sold is written to the sales table
+        store_idx, sku_idx = np.nonzero(sold)
+        sales.append(reconciled_sales(np.zeros(len(sku_idx), dtype=np.int64), shard.lo + store_idx, sku_idx,
+                                      sold[store_idx, sku_idx], dates, stores_df, products_df, rng))
+
+    state = replace(shard, on_hand=on_hand, on_order=on_order, due=due, cell=cell, quantity=quantity)
+    orders = tuple(np.concatenate(column) for column in zip(*orders))
+    return pd.concat(inventory, ignore_index=True), pd.concat(sales, ignore_index=True), orders, state
+
+
+# Shards held by a simulation worker process, by shard number
+_worker_shards = {}
+
+
+def _init_simulation_worker(context, layout):
+    global _worker_context, _worker_shards
+    _worker_context = context
+    seed, _, _, products_df = context
+    _worker_shards = {number: init_shard(seed, number, lo, hi, products_df) for number, lo, hi in layout}
+
+
+def _simulate_resident(number, day_indices):
+    """Step a shard held by this worker; only the rows and orders are sent back."""
+    inventory, sales, orders, _worker_shards[number] = simulate_days(*_worker_context, _worker_shards[number],
+                                                                     day_indices)
+    return inventory, sales, orders
+
+
+def _in_date_order(frames):
+    """Concatenate per-shard frames of the same days, ordered by date then store."""
+    df = pd.concat(frames, ignore_index=True)
+    return df.iloc[np.argsort(df['date'].to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+class StockSimulation:
+    """Day-stepping stock simulation over every store shard.
+
+    ``partitions()`` yields ``(inventory_df, sales_df)`` per block of whole
+    days like ``iter_partitions``; once it is exhausted,
+    ``purchase_orders()`` returns every order the simulation raised.
+    """
+
+    def __init__(self, seed, date_range, stores_df, products_df, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1):
+        self.context = (seed, date_range, stores_df, products_df)
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        stores_per_shard = max(1, SHARD_PAIRS // len(products_df))
+        # (shard number, first store, end store) of every shard
+        self.layout = [(number, lo, min(lo + stores_per_shard, len(stores_df)))
+                       for number, lo in enumerate(range(0, len(stores_df), stores_per_shard))]
+        self._orders = []
+
+    def partitions(self):
+        seed, date_range, stores_df, products_df = self.context
+        days_per_partition = max(1, self.chunk_rows // (len(stores_df) * len(products_df)))
+        blocks = [range(start, min(start + days_per_partition, len(date_range)))
+                  for start in range(0, len(date_range), days_per_partition)]
+
+        if self.workers <= 1:
+            shards = [init_shard(seed, number, lo, hi, products_df) for number, lo, hi in self.layout]
+            for day_indices in blocks:
+                results = [simulate_days(*self.context, shard, day_indices) for shard in shards]
+                shards = [state for *_, state in results]
+                yield self._collect([result[:3] for result in results])
+            return
+
+        # Each block needs every shard's state from the block before, so
+        # shards run in parallel within a block. Every shard lives in one
+        # worker process for the whole run (worker i holds shards i, i + n,
+        # ...), which builds it and carries its state from block to block, so
+        # only the block's rows and orders cross process boundaries.
+        pools = [ProcessPoolExecutor(1, initializer=_init_simulation_worker,
+                                     initargs=(self.context, self.layout[i::self.workers]))
+                 for i in range(min(self.workers, len(self.layout)))]
+        try:
+            for day_indices in blocks:
+                futures = [pools[i % len(pools)].submit(_simulate_resident, number, day_indices)
+                           for i, (number, _, _) in enumerate(self.layout)]
+                yield self._collect([future.result() for future in futures])
+        finally:
+            for pool in pools:
+                pool.shutdown(cancel_futures=True)
+
+    def _collect(self, results):
+        """Rows of one block from the ``(inventory, sales, orders)`` of every shard, in shard order."""
+        inventory, sales, orders = zip(*results)
+        self._orders.extend(orders)
+        return _in_date_order(inventory), _in_date_order(sales)
+
+    def purchase_orders(self):
+        """Purchase orders in order-date order; those due after the last day are still In Transit."""
+        _, date_range, stores_df, products_df = self.context
+        order_day, store_idx, sku_idx, quantity, due = (np.concatenate(column) for column in zip(*self._orders))
+        order = np.lexsort((sku_idx, store_idx, order_day))
+        order_day, store_idx, sku_idx, quantity, due = (a[order] for a in (order_day, store_idx, sku_idx, quantity, due))
+
+        unit_cost = products_df['cost'].to_numpy()[sku_idx]
+        dates = date_range[0] + pd.to_timedelta(order_day, unit='D')
+        return pd.DataFrame({
+            'po_number': format_ids('PO', np.arange(5000, 5000 + len(order_day)), 6).to_numpy(),
+            'order_date': dates.strftime('%Y-%m-%d'),
+            'expected_delivery': (date_range[0] + pd.to_timedelta(due, unit='D')).strftime('%Y-%m-%d'),
+            'store_id': stores_df['store_id'].to_numpy()[store_idx],
+            'sku': products_df['sku'].to_numpy()[sku_idx],
+            'supplier_id': products_df['supplier_id'].to_numpy()[sku_idx],
+            'order_quantity': quantity,
             'unit_cost': unit_cost,
-            'total_cost': total_cost,
-            'status': po_status
+            'total_cost': np.round(quantity * unit_cost, 2),
+            'status': np.where(due < len(date_range), 'Delivered', 'In Transit')
         })
-        po_id += 1
-
-po_df = pd.DataFrame(po_records)
-
-# ========== SAVE ALL FILES ==========
-stores_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_stores.csv', index=False)
-products_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_products.csv', index=False)
-suppliers_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_suppliers.csv', index=False)
-inventory_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_inventory.csv', index=False)
-sales_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_sales.csv', index=False)
-po_df.to_csv('C:/Users/alexy/Documents/Claude_projects/Portfolio creation/Dashboard_inventory/retail_purchase_orders.csv', index=False)
-
-
-# ========== SUMMARY ==========
-print("=" * 60)
-print("RETAIL INVENTORY DATA GENERATED SUCCESSFULLY")
-print("=" * 60)
-print(f"\n📍 Stores: {len(stores_df)} locations across {stores_df['state'].nunique()} states")
-print(f"📦 Products: {len(products_df)} SKUs across {products_df['department'].nunique()} departments")
-print(f"🏭 Suppliers: {len(suppliers_df)} suppliers")
-print(f"📊 Inventory Records: {len(inventory_df):,} daily snapshots")
-print(f"💰 Sales Transactions: {len(sales_df):,} transactions")
-print(f"📋 Purchase Orders: {len(po_df):,} POs")
-print(f"\n💵 Total Revenue: ${sales_df['revenue'].sum():,.2f}")
-print(f"💸 Total Profit: ${sales_df['profit'].sum():,.2f}")
-print(f"📈 Avg Profit Margin: {sales_df['profit_margin'].mean():.1f}%")
-print(f"\n📅 Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-print(f"📁 Files saved:")
-print("   - retail_stores.csv")
-print("   - retail_products.csv")
-print("   - retail_suppliers.csv")
-print("   - retail_inventory.csv")
-print("   - retail_sales.csv")
-print("   - retail_purchase_orders.csv")
-print("\n✅ Ready to build the dashboard!")
-print("=" * 60)
\ No newline at end of file
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic retail inventory datasets.")
+    parser.add_argument('--stores', type=int, default=8, help="number of store locations (default: 8)")
+    parser.add_argument('--skus', type=int, default=None,
+                        help="number of SKUs (default: 3-5 per category, ~50 total)")
+    parser.add_argument('--days', type=int, default=180, help="days of history to generate (default: 180)")
+    parser.add_argument('--start-date', default='2024-06-01', help="first snapshot date (default: 2024-06-01)")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (default: 42)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes (default: 1); output is identical for any value")
+    parser.add_argument('--output-dir', default='.', help="directory the tables are written to (default: .)")
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="csv files, or Parquet with date-partitioned fact tables (default: csv)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="approximate rows buffered per written chunk (default: 1,000,000)")
+    parser.add_argument('--simulate', action='store_true',
+                        help="carry stock over from day to day: sales are capped by stock on hand, and purchase "
+                             "orders are raised at reorder points and received on their delivery date "
+                             "(implies --reconcile)")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="split each snapshot's quantity_sold into sales lines, so sales quantities add up "
+                             "exactly to the inventory table")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = stream_rng(args.seed, DIMENSION_STREAM)
+
+    stores_df = build_stores(args.stores, rng)
+    products_df = build_products(args.skus, rng)
+    suppliers_df = build_suppliers(rng)
+
+    start_date = pd.Timestamp(args.start_date)
+    date_range = pd.date_range(start=start_date, periods=args.days, freq='D')
+    end_date = date_range[-1]
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # ========== SAVE ALL FILES ==========
+    # Dimensions are small and written whole; the fact tables are streamed
+    # chunk by chunk so peak memory does not grow with the generated history.
+    write_table(stores_df, output_dir, 'stores', args.format)
+    write_table(products_df, output_dir, 'products', args.format)
+    write_table(suppliers_df, output_dir, 'suppliers', args.format)
+
+    if args.simulate:
+        simulation = StockSimulation(args.seed, date_range, stores_df, products_df, args.chunk_rows, args.workers)
+        partitions = simulation.partitions()
+    else:
+        po_df = generate_purchase_orders(date_range, stores_df, products_df, stream_rng(args.seed, PO_STREAM))
+        partitions = iter_partitions(args.seed, date_range, stores_df, products_df, args.chunk_rows, args.workers,
+                                     args.reconcile)
+
+    inventory_writer = table_writer(output_dir, 'inventory', args.format)
+    sales_writer = table_writer(output_dir, 'sales', args.format)
+    total_revenue = total_profit = total_margin = 0.0
+    units_sold = units_in_sales = 0
+    for inventory_chunk, sales_chunk in partitions:
+        units_sold += int(inventory_chunk['quantity_sold'].sum())
+        units_in_sales += int(sales_chunk['quantity'].sum())
+        inventory_writer.write(inventory_chunk)
+        sales_writer.write(assign_transaction_ids(sales_chunk, 10000 + sales_writer.rows))
+        total_revenue += sales_chunk['revenue'].sum()
+        total_profit += sales_chunk['profit'].sum()
+        total_margin += sales_chunk['profit_margin'].sum()
+
+    # Simulated purchase orders are only known once every day has been stepped
+    if args.simulate:
+        po_df = simulation.purchase_orders()
+    write_table(po_df, output_dir, 'purchase_orders', args.format)
+
+    # ========== SUMMARY ==========
+    print("=" * 60)
+    print("RETAIL INVENTORY DATA GENERATED SUCCESSFULLY")
+    print("=" * 60)
+    print(f"\n📍 Stores: {len(stores_df)} locations across {stores_df['state'].nunique()} states")
+    print(f"📦 Products: {len(products_df)} SKUs across {products_df['department'].nunique()} departments")
+    print(f"🏭 Suppliers: {len(suppliers_df)} suppliers")
+    print(f"📊 Inventory Records: {inventory_writer.rows:,} daily snapshots")
+    print(f"💰 Sales Transactions: {sales_writer.rows:,} transactions")
+    print(f"📋 Purchase Orders: {len(po_df):,} POs")
+    print(f"\n💵 Total Revenue: ${total_revenue:,.2f}")
+    print(f"💸 Total Profit: ${total_profit:,.2f}")
+    print(f"📈 Avg Profit Margin: {total_margin / max(sales_writer.rows, 1):.1f}%")
+    if args.reconcile or args.simulate:
+        check = '✅' if units_sold == units_in_sales else '❌'
+        print(f"{check} Units sold: {units_sold:,} in inventory, {units_in_sales:,} in sales")
+    print(f"\n📅 Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+    print(f"📁 Files saved to {output_dir.resolve()}:")
+    for table in TABLES:
+        print(f"   - {table_path(output_dir, table, args.format).name}")
+    print("\n✅ Ready to build the dashboard!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Headless analytics behind the dashboard panels.
+
+Every panel is a plain function ``panel(data, rollups, filters)`` over a
+``RetailDataset``, its ``Rollups`` and a ``Filters`` value, returning pandas
+objects. The dashboard only renders their results, so the same numbers can be
+precomputed in batch jobs, profiled, or dumped from the command line:
+
+    python retail_analytics.py --start 2024-11-01 --end 2024-11-27 --output-dir panels/
+"""
+
+import argparse
+import json
+import time
+from dataclasses import asdict
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from retail_data import load_dataset
+from retail_filters import Filters, filter_index
+from retail_forecast import at_risk, dataset_stockouts
+from retail_reorder import evaluate_day, latest_day, reorder_engine
+from retail_rollups import build_rollups, latest_snapshot
+from retail_stockouts import pair_day_keys, revenue_index, summarize_losses
+
+
+@lru_cache(maxsize=4)
+def filter_facts(data, filters):
+    """Raw inventory and sales rows matching ``filters``.
+
+    Memoized for the last few filter states so panels sharing the same
+    filters slice the fact tables once.
+    """
+    # Fact tables are date-sorted, so a date range is a contiguous slice
+    if filters.start is not None:
+        inventory = data.inventory_index.slice(data.inventory, filters.start, filters.end)
+        sales = data.sales_index.slice(data.sales, filters.start, filters.end)
+    else:
+        inventory, sales = data.inventory, data.sales
+    # Store and product selections go through the bitmap index
+    index = filter_index(data)
+    return index.select(inventory, filters), index.select(sales, filters)
+
+
+def filter_rollups(data, rollups, filters):
+    """Daily store x department x category rollup rows (sales, inventory) matching ``filters``."""
+    index = filter_index(data)
+    return (index.select(rollups.sales.select(filters.start, filters.end), filters),
+            index.select(rollups.inventory.select(filters.start, filters.end), filters))
+
+
+# ========== PANELS ==========
+def kpis(data, rollups, filters):
+    """Headline KPIs: latest inventory value and status counts, period sales totals."""
+    sales_rollup, inventory_rollup = filter_rollups(data, rollups, filters)
+    current_rollup = latest_snapshot(inventory_rollup)
+    total_transactions = sales_rollup['transactions'].sum()
+    return {
+        'inventory_value': current_rollup['value_on_hand'].sum(),
+        'items': current_rollup['items'].sum(),
+        'revenue': sales_rollup['revenue'].sum(),
+        'profit': sales_rollup['profit'].sum(),
+        'transactions': total_transactions,
+        'avg_margin': sales_rollup['margin_sum'].sum() / total_transactions if total_transactions else float('nan'),
+        'stockouts': current_rollup['stockouts'].sum(),
+        'low_stock': current_rollup['low_stock'].sum()
+    }
+
+
+def heatmap(data, rollups, filters):
+    """Latest units on hand pivoted as department x store."""
+    current_rollup = latest_snapshot(filter_rollups(data, rollups, filters)[1])
+
+    # Aggregate by store and department
+    heatmap_data = current_rollup.groupby(['store_name', 'department'], observed=True).agg({
+        'quantity_on_hand': 'sum',
+        'stockouts': 'sum'
+    }).reset_index()
+
+    return heatmap_data.pivot(index='department', columns='store_name', values='quantity_on_hand')
+
+
+def abc_analysis(data, rollups, filters):
+    """Products ranked by revenue with A/B/C classes, plus the per-class summary."""
+    sales = filter_facts(data, filters)[1]
+
+    # Calculate cumulative revenue by product
+    product_revenue = sales.groupby('sku', observed=True)['revenue'].sum().sort_values(ascending=False).reset_index()
+    return classify_abc(product_revenue)
+
+
+def classify_abc(product_revenue):
+    """Rank per-SKU revenue (sorted descending) into A/B/C classes; returns it with the per-class summary."""
+    product_revenue['cumulative_revenue'] = product_revenue['revenue'].cumsum()
+    product_revenue['cumulative_pct'] = (product_revenue['cumulative_revenue'] / product_revenue['revenue'].sum()) * 100
+    product_revenue['rank'] = range(1, len(product_revenue) + 1)
+
+    # Classify ABC
+    product_revenue['class'] = 'C'
+    product_revenue.loc[product_revenue['cumulative_pct'] <= 80, 'class'] = 'A'
+    product_revenue.loc[(product_revenue['cumulative_pct'] > 80) & (product_revenue['cumulative_pct'] <= 95), 'class'] = 'B'
+
+    # ABC Summary
+    abc_summary = product_revenue.groupby('class').agg({
+        'sku': 'count',
+        'revenue': 'sum'
+    }).reset_index()
+    abc_summary.columns = ['Class', 'Product Count', 'Revenue']
+    abc_summary['Revenue %'] = (abc_summary['Revenue'] / abc_summary['Revenue'].sum() * 100).round(1)
+
+    return product_revenue, abc_summary
+
+
+def turnover(data, rollups, filters):
+    """COGS over the period divided by the average inventory value over its days, per department."""
+    sales_rollup = filter_rollups(data, rollups, filters)[0]
+
+    # Calculate turnover by department - use COGS from sales data
+    sales_by_dept = sales_rollup.groupby('department', observed=True).agg({
+        'revenue': 'sum',
+        'profit': 'sum'
+    }).reset_index()
+
+    # Calculate COGS (Cost of Goods Sold) = Revenue - Profit
+    sales_by_dept['cogs'] = sales_by_dept['revenue'] - sales_by_dept['profit']
+
+    # Average inventory value over the period, from the running totals of the inventory rollup
+    avg_inventory = filter_index(data).select(rollups.inventory_sums.mean(filters.start, filters.end), filters)
+    avg_inventory_by_dept = avg_inventory.groupby('department', observed=True)['value_on_hand'].sum().reset_index()
+    avg_inventory_by_dept.columns = ['department', 'avg_value_on_hand']
+
+    turnover_data = sales_by_dept.merge(avg_inventory_by_dept, on='department')
+    turnover_data['turnover_ratio'] = turnover_data['cogs'] / turnover_data['avg_value_on_hand']
+    turnover_data['turnover_ratio'] = turnover_data['turnover_ratio'].fillna(0)
+    return turnover_data
+
+
+def stockout_impact(data, rollups, filters):
+    """Stockout days and estimated lost revenue per store x department.
+
+    Each out-of-stock day is priced at its store x SKU's trailing average
+    daily revenue (see ``retail_stockouts``).
+    """
+    inventory = filter_facts(data, filters)[0]
+    stockouts = inventory[inventory['status'] == 'Out of Stock']
+    keys = pair_day_keys(data.days, len(data.products), stockouts)
+    return summarize_losses(stockouts, revenue_index(data).lost_revenue(keys))
+
+
+def supplier_scorecard(data, rollups, filters):
+    """Top 10 suppliers by PO spend with their reliability metrics (independent of filters)."""
+    # Merge PO data with supplier info
+    po_analysis = data.purchase_orders.merge(data.suppliers, on='supplier_id', how='left')
+    po_analysis = po_analysis.merge(data.products[['sku', 'department']], on='sku', how='left')
+
+    supplier_metrics = po_analysis.groupby('supplier_name').agg({
+        'po_number': 'count',
+        'total_cost': 'sum',
+        'reliability_score': 'first',
+        'defect_rate': 'first',
+        'avg_lead_time': 'first'
+    }).reset_index()
+
+    supplier_metrics.columns = ['Supplier', 'PO Count', 'Total Spend', 'Reliability %', 'Defect %', 'Avg Lead Time (days)']
+    return supplier_metrics.sort_values('Total Spend', ascending=False).head(10)
+
+
+def reorder_alerts(data, rollups, filters):
+    """Store x SKU pairs whose inventory position is at or below the reorder point on the latest filtered day."""
+    state = evaluate_day(data, latest_day(data.days, filters.start, filters.end))
+    index = filter_index(data)
+    return reorder_engine(data).alerts(state, index.stores(filters), index.products(filters))
+
+
+def stockout_forecast(data, rollups, filters):
+    """Store x SKU pairs forecast to run out of stock within ``HORIZON`` days of the last data day.
+
+    Forecasts look ahead from the end of the history, so only the store and
+    product filters apply.
+    """
+    return at_risk(dataset_stockouts(data), filter_index(data), filters)
+
+
+def daily_sales(data, rollups, filters):
+    """Revenue, profit and transaction count per day."""
+    daily = filter_rollups(data, rollups, filters)[0].groupby('date').agg({
+        'revenue': 'sum',
+        'profit': 'sum',
+        'transactions': 'sum'
+    }).reset_index()
+
+    daily.columns = ['Date', 'Revenue', 'Profit', 'Transactions']
+    return daily
+
+
+# Panel name -> computation, in dashboard order
+PANELS = {
+    'kpis': kpis,
+    'heatmap': heatmap,
+    'abc': abc_analysis,
+    'turnover': turnover,
+    'stockout': stockout_impact,
+    'supplier': supplier_scorecard,
+    'reorder': reorder_alerts,
+    'forecast': stockout_forecast,
+    'trends': daily_sales
+}
+
+# Panels whose result does not depend on the filters
+FILTER_INDEPENDENT = {'supplier'}
+
+# Results memoized per dataset object; cleared when a refresh supersedes the
+# dataset so the old tables are not kept alive by their cache entries
+DATASET_CACHES = (filter_facts, filter_index, revenue_index, reorder_engine, dataset_stockouts)
+
+# Export names for panels returning several frames
+PANEL_FRAME_NAMES = {'abc': ['abc', 'abc_summary']}
+
+# Fact-table columns read by each panel; loaders project their union with
+# required_columns() so unused columns are never parsed
+PANEL_COLUMNS = {
+    'filters': {'inventory': ['date', 'store_id', 'sku'], 'sales': ['date', 'store_id', 'sku']},
+    'kpis': {'inventory': ['value_on_hand', 'status'],
+             'sales': ['transaction_id', 'revenue', 'profit', 'profit_margin']},
+    'heatmap': {'inventory': ['quantity_on_hand', 'status']},
+    'abc': {'sales': ['revenue']},
+    'turnover': {'inventory': ['value_on_hand'], 'sales': ['revenue', 'profit']},
+    'stockout': {'inventory': ['status'], 'sales': ['revenue']},
+    'reorder': {'inventory': ['quantity_on_hand', 'quantity_sold']},
+    'forecast': {'inventory': ['quantity_on_hand', 'quantity_sold']},
+    'trends': {'sales': ['transaction_id', 'revenue', 'profit']},
+    'rollups': {'inventory': ['quantity_on_hand', 'value_on_hand', 'status'],
+                'sales': ['transaction_id', 'revenue', 'profit', 'cost', 'quantity', 'profit_margin']}
+}
+
+
+def run_panels(data, rollups, filters, panels=None):
+    """Compute ``panels`` (default: all), returning ``(results, seconds)`` dicts keyed by panel."""
+    results, timings = {}, {}
+    for name in panels or PANELS:
+        started = time.perf_counter()
+        results[name] = PANELS[name](data, rollups, filters)
+        timings[name] = time.perf_counter() - started
+    return results, timings
+
+
+def _as_frames(name, result):
+    """Flatten a panel result into named DataFrames for export."""
+    if isinstance(result, dict):
+        return {name: pd.DataFrame([result])}
+    if isinstance(result, tuple):
+        return dict(zip(PANEL_FRAME_NAMES[name], result))
+    return {name: result}
+
+
+def dump_panels(results, output_dir, fmt='csv'):
+    """Write every panel result to ``output_dir`` as CSV or JSON files."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, result in results.items():
+        for frame_name, frame in _as_frames(name, result).items():
+            if frame.index.name is not None:
+                frame = frame.reset_index()
+            path = output_dir / f'{frame_name}.{fmt}'
+            if fmt == 'json':
+                frame.to_json(path, orient='records', date_format='iso', indent=2)
+            else:
+                frame.to_csv(path, index=False)
+            written.append(path)
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute the dashboard panels for one filter set.")
+    parser.add_argument('--data-dir', default='.', help="directory holding the generated tables (default: .)")
+    parser.add_argument('--start', type=date.fromisoformat, help="first date (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="last date (YYYY-MM-DD)")
+    parser.add_argument('--stores', nargs='+', default=(), help="store_ids to restrict to, e.g. ST003 ST005")
+    parser.add_argument('--regions', nargs='+', default=(), help="regions to restrict to")
+    parser.add_argument('--store-types', nargs='+', default=(), help="store types to restrict to")
+    parser.add_argument('--departments', nargs='+', default=(), help="departments to restrict to")
+    parser.add_argument('--categories', nargs='+', default=(), help="categories to restrict to")
+    parser.add_argument('--panels', nargs='+', choices=list(PANELS), help="panels to compute (default: all)")
+    parser.add_argument('--output-dir', help="write each panel result to this directory")
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv', help="output file format (default: csv)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    started = time.perf_counter()
+    data = load_dataset(args.data_dir)
+    rollups = build_rollups(data)
+    load_seconds = time.perf_counter() - started
+
+    start, end = args.start, args.end
+    if (start is None) != (end is None):
+        start = start or data.inventory_index.days[0].item()
+        end = end or data.inventory_index.days[-1].item()
+    filters = Filters(start, end, args.stores, args.regions, args.store_types, args.departments, args.categories)
+
+    results, timings = run_panels(data, rollups, filters, args.panels)
+
+    print(f"Loaded data in {load_seconds:.2f}s  filters: {asdict(filters)}")
+    for name, seconds in timings.items():
+        print(f"  {name:<10} {seconds * 1000:8.1f} ms")
+    if 'kpis' in results:
+        print(json.dumps({k: float(v) for k, v in results['kpis'].items()}, indent=2))
+
+    if args.output_dir:
+        written = dump_panels(results, args.output_dir, args.format)
+        print(f"Wrote {len(written)} files to {Path(args.output_dir).resolve()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded memoization for dashboard panel computations.
+
+Streamlit reruns the whole script on every widget change; computing each
+panel through ``PanelCache.get_or_compute`` under its data version and filter
+key means a rerun only recomputes the panels whose key changed.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class PanelCache:
+    """Thread-safe LRU cache with an optional time-to-live and per-panel hit/miss counters.
+
+    Keys are ``(panel, *key)`` tuples, so every part of a key must be
+    hashable (data versions, dates, ids, ``Filters`` values).
+    """
+
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.evictions = 0
+
+    def _count(self, panel, field):
+        counts = self._stats.setdefault(panel, {'hits': 0, 'misses': 0})
+        counts[field] += 1
+
+    def get_or_compute(self, panel, key, compute):
+        """Return the cached value for ``(panel, key)``, computing and storing it on a miss."""
+        full_key = (panel, *key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and (self.ttl is None or now - entry[0] < self.ttl):
+                self._entries.move_to_end(full_key)
+                self._count(panel, 'hits')
+                return entry[1]
+            self._count(panel, 'misses')
+
+        # Computed outside the lock so slow panels don't serialize other sessions
+        value = compute()
+
+        with self._lock:
+            self._entries[full_key] = (now, value)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hits, misses and hit rate per panel."""
+        with self._lock:
+            rows = [{'Panel': panel, 'Hits': c['hits'], 'Misses': c['misses']} for panel, c in self._stats.items()]
+        report = pd.DataFrame(rows, columns=['Panel', 'Hits', 'Misses'])
+        total = report['Hits'] + report['Misses']
+        report['Hit Rate %'] = (report['Hits'] / total.where(total > 0) * 100).round(1)
+        return report
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Server-side downsampling for the dashboard charts.
+
+Plotly ships every point of every trace to the browser, so long histories
+and large catalogs are reduced before plotting:
+
+- trends are resampled to weekly or monthly totals when the date range is
+  long (``RESAMPLE_RULES``);
+- line traces are thinned with Largest-Triangle-Three-Buckets (LTTB), which
+  keeps the points that shape the curve, and bar traces with min/max
+  bucketing, which keeps every spike;
+- the Pareto chart groups products into rank buckets.
+
+Each trace is capped at the number of points its chart can show at
+``PX_PER_POINT`` pixels per point.
+"""
+
+import numpy as np
+
+# Horizontal pixels per plotted point
+PX_PER_POINT = 2
+
+# (longest date range in days, resample rule, period label), finest first
+RESAMPLE_RULES = [(366, 'D', 'Daily'), (3 * 366, 'W', 'Weekly'), (None, 'MS', 'Monthly')]
+
+
+def points_for_width(width_px, px_per_point=PX_PER_POINT):
+    """Most points worth plotting across a chart ``width_px`` pixels wide."""
+    return max(3, int(width_px // px_per_point))
+
+
+def _numeric(x):
+    x = np.asarray(x)
+    return x.astype('int64').astype('float64') if np.issubdtype(x.dtype, np.datetime64) else x.astype('float64')
+
+
+def lttb(x, y, max_points):
+    """Positions of at most ``max_points`` points of (x, y) that preserve its shape (LTTB).
+
+    The first and last points are always kept; in between, each bucket keeps
+    the point forming the largest triangle with the point kept before it and
+    the average of the next bucket.
+    """
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    x, y = _numeric(x), _numeric(y)
+
+    # max_points - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])[1:]
+    next_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1])[1:]
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    for bucket in range(max_points - 2):
+        a = kept[bucket]
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[a] - next_x[bucket]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a]))
+        kept[bucket + 1] = lo + np.argmax(area)
+    return kept
+
+
+def minmax(y, max_points):
+    """Positions of the lowest and highest point of each of ``max_points // 2`` equal buckets."""
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    bucket = np.arange(n) * (max_points // 2) // n
+    order = np.lexsort((_numeric(y), bucket))
+    first = np.flatnonzero(np.diff(bucket[order], prepend=-1))
+    last = np.append(first[1:] - 1, n - 1)
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def resample_trends(daily):
+    """Daily ``Date``/measure totals, resampled to weeks or months for long ranges.
+
+    Returns the frame and its period label ('Daily', 'Weekly' or 'Monthly').
+    """
+    span = (daily['Date'].max() - daily['Date'].min()).days + 1 if len(daily) else 0
+    for max_days, rule, label in RESAMPLE_RULES:
+        if max_days is None or span <= max_days:
+            break
+    if rule == 'D':
+        return daily, label
+    return daily.resample(rule, on='Date').sum().reset_index(), label
+
+
+def pareto_buckets(product_revenue, max_bars):
+    """``classify_abc`` ranking grouped into at most ``max_bars`` consecutive rank buckets.
+
+    Each bucket keeps its last rank and cumulative share, so the Pareto curve
+    stays exact at the bucket edges, and the mean revenue of its products.
+    """
+    n = len(product_revenue)
+    if n <= max_bars:
+        return product_revenue[['rank', 'revenue', 'cumulative_pct']]
+    bucket = np.arange(n) * max_bars // n
+    return product_revenue.groupby(bucket).agg(
+        rank=('rank', 'last'), revenue=('revenue', 'mean'), cumulative_pct=('cumulative_pct', 'last'))
+
+
+def thin_line(df, x, y, max_points):
+    """Rows of ``df`` kept when ``y`` is drawn as a line against ``x``."""
+    return df.iloc[lttb(df[x].to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def thin_bars(df, y, max_points):
+    """Rows of ``df`` kept when ``y`` is drawn as bars."""
+    return df.iloc[minmax(df[y].to_numpy(), max_points)]
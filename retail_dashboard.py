@@ -1,10 +1,47 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from dataclasses import asdict
 from datetime import datetime, timedelta
-import numpy as np
+import os
+
+from retail_analytics import DATASET_CACHES, FILTER_INDEPENDENT, PANEL_COLUMNS, PANELS, Filters
+from retail_cache import PanelCache
+from retail_charts import pareto_buckets, points_for_width, resample_trends, thin_bars, thin_line
+from retail_data import memory_report, required_columns
+from retail_ingest import IncrementalLoader
+from retail_profiling import Profiler
+from retail_reorder import PRIORITIES
+from retail_shared import SharedTables
+from retail_sql import SQL_DATASET_CACHES, SQL_PANELS, DatabaseLoader
+
+# Directory holding the generated tables (CSV files or Parquet partitions)
+DATA_DIR = os.environ.get('RETAIL_DATA_DIR', '.')
+
+# 'pandas' holds the fact tables in memory; 'sqlite' or 'duckdb' query a
+# database built with retail_sql.py (RETAIL_DB, default retail.<backend> in
+# the data directory) and keep only aggregates in the process
+BACKEND = os.environ.get('RETAIL_BACKEND', 'pandas')
+DB_PATH = os.environ.get('RETAIL_DB', os.path.join(DATA_DIR, f'retail.{BACKEND}'))
+BACKEND_PANELS = PANELS if BACKEND == 'pandas' else SQL_PANELS
+BACKEND_CACHES = DATASET_CACHES if BACKEND == 'pandas' else SQL_DATASET_CACHES
+
+# Memory-mapped snapshots of the loaded tables, shared by every dashboard
+# process reading the same data directory (set RETAIL_SHARED_DIR to an empty
+# string to keep a private copy per process)
+SHARED_DIR = os.environ.get('RETAIL_SHARED_DIR', os.path.join(DATA_DIR, 'retail_shared'))
+
+# Panel results cache: at most this many (panel, filters) entries, each kept
+# for up to an hour
+PANEL_CACHE_ENTRIES = 256
+PANEL_CACHE_TTL = 3600
+
+# Width in pixels of a full-width chart; traces are downsampled to what it can show
+CHART_WIDTH_PX = 1400
+
+# Profile every rerun by default (the sidebar toggle overrides it per session)
+PROFILE_DEFAULT = os.environ.get('RETAIL_PROFILE', '') not in ('', '0')
 
 # Page configuration
 st.set_page_config(
@@ -64,37 +101,59 @@ st.markdown("""
     </div>
     """, unsafe_allow_html=True)
 
-# Load data
-@st.cache_data
-def load_data():
-    stores = pd.read_csv('retail_stores.csv')
-    products = pd.read_csv('retail_products.csv')
-    suppliers = pd.read_csv('retail_suppliers.csv')
-    inventory = pd.read_csv('retail_inventory.csv')
-    sales = pd.read_csv('retail_sales.csv')
-    purchase_orders = pd.read_csv('retail_purchase_orders.csv')
-    
-    # Convert dates
-    inventory['date'] = pd.to_datetime(inventory['date'])
-    sales['date'] = pd.to_datetime(sales['date'])
-    purchase_orders['order_date'] = pd.to_datetime(purchase_orders['order_date'])
-    purchase_orders['expected_delivery'] = pd.to_datetime(purchase_orders['expected_delivery'])
-    
-    return stores, products, suppliers, inventory, sales, purchase_orders
+# Profiling: the sidebar toggle is drawn at the end of the script, so read its
+# state from the session before any section runs
+profiler = Profiler(enabled=st.session_state.get('profile', PROFILE_DEFAULT))
 
+# Load data
+# The loader is a shared resource: the fact tables and rollups are built once
+# per process and handed to every rerun without being copied, so they must not
+# be mutated. Each rerun asks it to pick up newly landed rows, which are
+# appended in place of a full reload and bump the data version. The tables
+# themselves live in memory-mapped files under SHARED_DIR, so other processes
+# serving the dashboard map the same pages instead of loading their own copy.
+# With a SQL backend the database is reopened whenever it is rebuilt.
+@st.cache_resource
+def get_loader(data_dir=DATA_DIR):
+    if BACKEND != 'pandas':
+        return DatabaseLoader(DB_PATH, BACKEND)
+    return IncrementalLoader(data_dir, columns=required_columns(PANEL_COLUMNS),
+                             shared=SharedTables(SHARED_DIR) if SHARED_DIR else None)
+
+@st.cache_data(max_entries=1)
+def load_memory_report(data_version, data_dir=DATA_DIR):
+    return memory_report(get_loader(data_dir).dataset.tables)
+
+profiler.lap('load_data')
 try:
-    stores_df, products_df, suppliers_df, inventory_df, sales_df, po_df = load_data()
+    loader = get_loader()
+    refreshed = loader.refresh()
+    data_version, data, rollups = loader.snapshot()
 except Exception as e:
     st.error(f"Error loading data: {e}")
-    st.info("Make sure all CSV files are in the same directory as this dashboard.")
+    if BACKEND == 'pandas':
+        st.info("Make sure the generated CSV or Parquet files are in the same directory as this dashboard "
+                "(or set RETAIL_DATA_DIR).")
+    else:
+        st.info(f"Build the {BACKEND} database first: python retail_sql.py --backend {BACKEND} --db {DB_PATH}")
     st.stop()
 
+stores_df, products_df, suppliers_df = data.stores, data.products, data.suppliers
+memory_df = load_memory_report(data_version)
+
+profiler.lap('filters')
+
 # Sidebar
 st.sidebar.title("Filters")
 
+with st.sidebar.expander("Memory Usage"):
+    st.dataframe(memory_df.style.format({'Rows': '{:,}', 'Memory (MB)': '{:.1f}'}), hide_index=True)
+    st.caption(f"Total: {memory_df['Memory (MB)'].sum():,.1f} MB")
+    st.caption(f"Data version {data_version} ({loader.last_change})")
+
 # Date range filter
-min_date = inventory_df['date'].min().date()
-max_date = inventory_df['date'].max().date()
+min_date = data.days[0].item()
+max_date = data.days[-1].item()
 date_range = st.sidebar.date_input(
     "Date Range",
     value=(max_date - timedelta(days=30), max_date),
@@ -102,78 +161,77 @@ date_range = st.sidebar.date_input(
     max_value=max_date
 )
 
-if len(date_range) == 2:
-    inventory_filtered = inventory_df[
-        (inventory_df['date'].dt.date >= date_range[0]) & 
-        (inventory_df['date'].dt.date <= date_range[1])
-    ]
-    sales_filtered = sales_df[
-        (sales_df['date'].dt.date >= date_range[0]) & 
-        (sales_df['date'].dt.date <= date_range[1])
-    ]
-else:
-    inventory_filtered = inventory_df
-    sales_filtered = sales_df
-
-# Store filter
-store_options = ['All Stores'] + sorted(stores_df['store_name'].tolist())
-selected_store = st.sidebar.selectbox("Store", store_options)
-
-if selected_store != 'All Stores':
-    store_id = stores_df[stores_df['store_name'] == selected_store]['store_id'].iloc[0]
-    inventory_filtered = inventory_filtered[inventory_filtered['store_id'] == store_id]
-    sales_filtered = sales_filtered[sales_filtered['store_id'] == store_id]
-
-# Department filter
-dept_options = ['All Departments'] + sorted(products_df['department'].unique().tolist())
-selected_dept = st.sidebar.selectbox("Department", dept_options)
-
-if selected_dept != 'All Departments':
-    dept_skus = products_df[products_df['department'] == selected_dept]['sku'].tolist()
-    inventory_filtered = inventory_filtered[inventory_filtered['sku'].isin(dept_skus)]
-    sales_filtered = sales_filtered[sales_filtered['sku'].isin(dept_skus)]
-
-# Merge data for analysis
-inventory_enhanced = inventory_filtered.merge(products_df, on='sku', how='left')
-inventory_enhanced = inventory_enhanced.merge(stores_df[['store_id', 'store_name', 'region']], on='store_id', how='left')
-
-sales_enhanced = sales_filtered.merge(products_df, on='sku', how='left')
-sales_enhanced = sales_enhanced.merge(stores_df[['store_id', 'store_name', 'region']], on='store_id', how='left')
-
-# Get latest inventory snapshot
-latest_date = inventory_filtered['date'].max()
-current_inventory = inventory_filtered[inventory_filtered['date'] == latest_date]
-current_inventory_enhanced = current_inventory.merge(products_df, on='sku', how='left')
-current_inventory_enhanced = current_inventory_enhanced.merge(
-    stores_df[['store_id', 'store_name', 'region']], 
-    on='store_id', 
-    how='left'
+filter_start, filter_end = date_range if len(date_range) == 2 else (None, None)
+
+# Store and product filters: pick any number of values in each (none = all);
+# values within a filter are combined with OR, filters with AND
+selected_stores = st.sidebar.multiselect("Stores", sorted(stores_df['store_name'].astype(str)), placeholder="All stores")
+selected_regions = st.sidebar.multiselect("Regions", sorted(stores_df['region'].unique().astype(str)),
+                                          placeholder="All regions")
+selected_types = st.sidebar.multiselect("Store types", sorted(stores_df['store_type'].unique().astype(str)),
+                                        placeholder="All store types")
+selected_depts = st.sidebar.multiselect("Departments", sorted(products_df['department'].unique().astype(str)),
+                                        placeholder="All departments")
+
+# Only offer the categories of the selected departments
+category_products = products_df[products_df['department'].isin(selected_depts)] if selected_depts else products_df
+selected_categories = st.sidebar.multiselect("Categories", sorted(category_products['category'].unique().astype(str)),
+                                             placeholder="All categories")
+
+filters = Filters(
+    filter_start, filter_end,
+    store_ids=stores_df.loc[stores_df['store_name'].isin(selected_stores), 'store_id'].astype(str),
+    regions=selected_regions,
+    store_types=selected_types,
+    departments=selected_depts,
+    categories=selected_categories
 )
 
+# ========== PANEL COMPUTATIONS ==========
+# Each panel's numbers are memoized per data version and filter state in a
+# process-wide LRU cache, so changing one widget only recomputes the panels
+# that depend on it, a cache hit never touches the fact tables, and results
+# from before an ingest are never served.
+@st.cache_resource
+def get_panel_cache():
+    return PanelCache(max_entries=PANEL_CACHE_ENTRIES, ttl=PANEL_CACHE_TTL)
+
+panel_cache = get_panel_cache()
+
+# A new data version supersedes the previous dataset: drop every result
+# memoized on it, so its tables are freed instead of lingering in the caches
+if refreshed:
+    panel_cache.clear()
+    for cache in BACKEND_CACHES:
+        cache.cache_clear()
+
+def compute_panel(name):
+    """Result of analytics panel ``name`` for the current filters, via the panel cache."""
+    key = (data_version,) if name in FILTER_INDEPENDENT else (data_version, filters)
+    with profiler.section('compute'):
+        return panel_cache.get_or_compute(name, key, lambda: BACKEND_PANELS[name](data, rollups, filters))
+
 # ========== KPIs ==========
+profiler.lap('kpis')
 st.subheader("Key Performance Indicators")
 
 col1, col2, col3, col4, col5 = st.columns(5)
 
-total_inventory_value = current_inventory_enhanced['value_on_hand'].sum()
-total_revenue = sales_enhanced['revenue'].sum()
-total_profit = sales_enhanced['profit'].sum()
-avg_margin = sales_enhanced['profit_margin'].mean()
-
-stockout_count = len(current_inventory[current_inventory['status'] == 'Out of Stock'])
-low_stock_count = len(current_inventory[current_inventory['status'] == 'Low Stock'])
+kpis = compute_panel('kpis')
+stockout_count = kpis['stockouts']
+low_stock_count = kpis['low_stock']
 
 with col1:
-    st.metric("Inventory Value", f"${total_inventory_value:,.0f}", 
-              delta=f"{len(current_inventory):,} items")
+    st.metric("Inventory Value", f"${kpis['inventory_value']:,.0f}", 
+              delta=f"{kpis['items']:,} items")
 
 with col2:
-    st.metric("Total Revenue", f"${total_revenue:,.0f}",
-              delta=f"{len(sales_enhanced):,} transactions")
+    st.metric("Total Revenue", f"${kpis['revenue']:,.0f}",
+              delta=f"{kpis['transactions']:,} transactions")
 
 with col3:
-    st.metric("Total Profit", f"${total_profit:,.0f}",
-              delta=f"{avg_margin:.1f}% margin")
+    st.metric("Total Profit", f"${kpis['profit']:,.0f}",
+              delta=f"{kpis['avg_margin']:.1f}% margin")
 
 with col4:
     st.metric("Stockouts", stockout_count, 
@@ -187,344 +245,391 @@ with col5:
 
 st.markdown("---")
 
-# ========== INVENTORY HEALTH HEATMAP ==========
-st.subheader("Inventory Health Heatmap")
-st.markdown("Visual overview of stock levels across stores and departments")
-
-# Aggregate by store and department
-heatmap_data = current_inventory_enhanced.groupby(['store_name', 'department']).agg({
-    'quantity_on_hand': 'sum',
-    'status': lambda x: (x == 'Out of Stock').sum()
-}).reset_index()
-
-heatmap_pivot = heatmap_data.pivot(index='department', columns='store_name', values='quantity_on_hand')
-
-fig_heatmap = go.Figure(data=go.Heatmap(
-    z=heatmap_pivot.values,
-    x=heatmap_pivot.columns,
-    y=heatmap_pivot.index,
-    colorscale='RdYlGn',
-    text=heatmap_pivot.values,
-    texttemplate='%{text:.0f}',
-    textfont={"size": 10},
-    colorbar=dict(title="Stock Level")
-))
-
-fig_heatmap.update_layout(
-    title="Stock Levels by Store and Department",
-    xaxis_title="Store",
-    yaxis_title="Department",
-    height=400
-)
-
-st.plotly_chart(fig_heatmap, use_container_width=True)
-
-st.markdown("---")
-
-# ========== ABC ANALYSIS ==========
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("ABC Analysis - Revenue Concentration")
-    
-    # Calculate cumulative revenue by product
-    product_revenue = sales_enhanced.groupby('sku')['revenue'].sum().sort_values(ascending=False).reset_index()
-    product_revenue['cumulative_revenue'] = product_revenue['revenue'].cumsum()
-    product_revenue['cumulative_pct'] = (product_revenue['cumulative_revenue'] / product_revenue['revenue'].sum()) * 100
-    product_revenue['rank'] = range(1, len(product_revenue) + 1)
-    
-    # Classify ABC
-    product_revenue['class'] = 'C'
-    product_revenue.loc[product_revenue['cumulative_pct'] <= 80, 'class'] = 'A'
-    product_revenue.loc[(product_revenue['cumulative_pct'] > 80) & (product_revenue['cumulative_pct'] <= 95), 'class'] = 'B'
-    
-    fig_abc = go.Figure()
-    
-    fig_abc.add_trace(go.Bar(
-        x=product_revenue['rank'],
-        y=product_revenue['revenue'],
-        name='Revenue',
-        marker_color='#a8c0ff'
-    ))
-    
-    fig_abc.add_trace(go.Scatter(
-        x=product_revenue['rank'],
-        y=product_revenue['cumulative_pct'],
-        name='Cumulative %',
-        yaxis='y2',
-        line=dict(color='#e59866', width=3)
+# ========== PANEL VIEWS ==========
+# Only the selected view runs, so its panels are the only ones computed on a
+# rerun. Each view is a fragment: widgets inside it rerun just that view,
+# not the data refresh, the KPIs or the other panels.
+
+@st.fragment
+def inventory_health_view():
+    """Stock levels across stores and departments."""
+    st.subheader("Inventory Health Heatmap")
+    st.markdown("Visual overview of stock levels across stores and departments")
+
+    heatmap_pivot = compute_panel('heatmap')
+
+    fig_heatmap = go.Figure(data=go.Heatmap(
+        z=heatmap_pivot.values,
+        x=heatmap_pivot.columns,
+        y=heatmap_pivot.index,
+        colorscale='RdYlGn',
+        text=heatmap_pivot.values,
+        texttemplate='%{text:.0f}',
+        textfont={"size": 10},
+        colorbar=dict(title="Stock Level")
     ))
-    
-    fig_abc.update_layout(
-        title='Products Ranked by Revenue (Pareto)',
-        xaxis_title='Product Rank',
-        yaxis_title='Revenue ($)',
-        yaxis2=dict(
-            title='Cumulative %',
-            overlaying='y',
-            side='right',
-            range=[0, 100]
-        ),
-        hovermode='x unified',
-        height=400
-    )
-    
-    st.plotly_chart(fig_abc, use_container_width=True)
-    
-    # ABC Summary
-    abc_summary = product_revenue.groupby('class').agg({
-        'sku': 'count',
-        'revenue': 'sum'
-    }).reset_index()
-    abc_summary.columns = ['Class', 'Product Count', 'Revenue']
-    abc_summary['Revenue %'] = (abc_summary['Revenue'] / abc_summary['Revenue'].sum() * 100).round(1)
-    
-    st.dataframe(abc_summary, use_container_width=True, hide_index=True)
 
-with col2:
-    st.subheader("Inventory Turnover Analysis")
-    
-    # Calculate turnover by department - use COGS from sales data
-    sales_by_dept = sales_enhanced.groupby('department').agg({
-        'revenue': 'sum',
-        'profit': 'sum'
-    }).reset_index()
-    
-    # Calculate COGS (Cost of Goods Sold) = Revenue - Profit
-    sales_by_dept['cogs'] = sales_by_dept['revenue'] - sales_by_dept['profit']
-    
-    avg_inventory_by_dept = current_inventory_enhanced.groupby('department')['value_on_hand'].sum().reset_index()
-    
-    turnover_data = sales_by_dept.merge(avg_inventory_by_dept, on='department')
-    turnover_data['turnover_ratio'] = turnover_data['cogs'] / turnover_data['value_on_hand']
-    turnover_data['turnover_ratio'] = turnover_data['turnover_ratio'].fillna(0)
-    
-    fig_turnover = px.bar(
-        turnover_data.sort_values('turnover_ratio', ascending=True),
-        y='department',
-        x='turnover_ratio',
-        orientation='h',
-        title='Inventory Turnover by Department',
-        labels={'turnover_ratio': 'Turnover Ratio', 'department': 'Department'},
-        color='turnover_ratio',
-        color_continuous_scale='Mint'
-    )
-    
-    fig_turnover.update_layout(
-        showlegend=False,
+    fig_heatmap.update_layout(
+        title="Stock Levels by Store and Department",
+        xaxis_title="Store",
+        yaxis_title="Department",
         height=400
     )
-    
-    st.plotly_chart(fig_turnover, use_container_width=True)
-    
-    st.info("Higher turnover = faster inventory movement = better efficiency")
 
-st.markdown("---")
+    st.plotly_chart(fig_heatmap, use_container_width=True)
 
-# ========== STOCKOUT COST ANALYSIS ==========
-st.subheader("Stockout Impact Analysis")
 
-stockout_records = inventory_enhanced[inventory_enhanced['status'] == 'Out of Stock']
-stockout_analysis = stockout_records.groupby(['store_name', 'department']).size().reset_index(name='stockout_days')
+@st.fragment
+def abc_turnover_view():
+    """Revenue concentration and inventory turnover side by side."""
+    col1, col2 = st.columns(2)
 
-# Estimate lost revenue (assume avg daily sales * retail price)
-estimated_daily_loss = sales_enhanced.groupby('sku')['revenue'].mean().mean()
-stockout_analysis['estimated_lost_revenue'] = stockout_analysis['stockout_days'] * estimated_daily_loss
+    with col1:
+        st.subheader("ABC Analysis - Revenue Concentration")
+
+        product_revenue, abc_summary = compute_panel('abc')
+
+        # Large catalogs are drawn as rank buckets of mean product revenue
+        pareto = pareto_buckets(product_revenue, points_for_width(CHART_WIDTH_PX / 2))
+        bucketed = len(pareto) < len(product_revenue)
+
+        fig_abc = go.Figure()
+
+        fig_abc.add_trace(go.Bar(
+            x=pareto['rank'],
+            y=pareto['revenue'],
+            name='Avg Revenue per Product' if bucketed else 'Revenue',
+            marker_color='#a8c0ff'
+        ))
+
+        fig_abc.add_trace(go.Scatter(
+            x=pareto['rank'],
+            y=pareto['cumulative_pct'],
+            name='Cumulative %',
+            yaxis='y2',
+            line=dict(color='#e59866', width=3)
+        ))
+
+        fig_abc.update_layout(
+            title='Products Ranked by Revenue (Pareto)',
+            xaxis_title='Product Rank',
+            yaxis_title='Avg Revenue per Product ($)' if bucketed else 'Revenue ($)',
+            yaxis2=dict(
+                title='Cumulative %',
+                overlaying='y',
+                side='right',
+                range=[0, 100]
+            ),
+            hovermode='x unified',
+            height=400
+        )
+
+        st.plotly_chart(fig_abc, use_container_width=True)
+
+        st.dataframe(abc_summary, use_container_width=True, hide_index=True)
 
-col1, col2 = st.columns(2)
+    with col2:
+        st.subheader("Inventory Turnover Analysis")
 
-with col1:
-    fig_stockout_store = px.bar(
-        stockout_analysis.groupby('store_name')['stockout_days'].sum().sort_values(ascending=False).reset_index(),
-        x='stockout_days',
-        y='store_name',
-        orientation='h',
-        title='Stockout Days by Store',
-        labels={'stockout_days': 'Total Stockout Days', 'store_name': 'Store'},
-        color='stockout_days',
-        color_continuous_scale='Reds'
-    )
-    st.plotly_chart(fig_stockout_store, use_container_width=True)
+        turnover_data = compute_panel('turnover')
 
-with col2:
-    total_lost_revenue = stockout_analysis['estimated_lost_revenue'].sum()
-    
-    fig_stockout_dept = px.pie(
-        stockout_analysis.groupby('department')['estimated_lost_revenue'].sum().reset_index(),
-        values='estimated_lost_revenue',
-        names='department',
-        title=f'Estimated Lost Revenue: ${total_lost_revenue:,.0f}',
-        color_discrete_sequence=['#FFB6C1', '#B0E0E6', '#98D8C8', '#F7DC6F']
-    )
-    st.plotly_chart(fig_stockout_dept, use_container_width=True)
+        fig_turnover = px.bar(
+            turnover_data.sort_values('turnover_ratio', ascending=True),
+            y='department',
+            x='turnover_ratio',
+            orientation='h',
+            title='Inventory Turnover by Department',
+            labels={'turnover_ratio': 'Turnover Ratio', 'department': 'Department'},
+            color='turnover_ratio',
+            color_continuous_scale='Mint'
+        )
 
-st.markdown("---")
+        fig_turnover.update_layout(
+            showlegend=False,
+            height=400
+        )
 
-# ========== SUPPLIER SCORECARD ==========
-st.subheader("Supplier Performance Scorecard")
-
-# Merge PO data with supplier info
-po_analysis = po_df.merge(suppliers_df, on='supplier_id', how='left')
-po_analysis = po_analysis.merge(products_df[['sku', 'department']], on='sku', how='left')
-
-supplier_metrics = po_analysis.groupby('supplier_name').agg({
-    'po_number': 'count',
-    'total_cost': 'sum',
-    'reliability_score': 'first',
-    'defect_rate': 'first',
-    'avg_lead_time': 'first'
-}).reset_index()
-
-supplier_metrics.columns = ['Supplier', 'PO Count', 'Total Spend', 'Reliability %', 'Defect %', 'Avg Lead Time (days)']
-supplier_metrics = supplier_metrics.sort_values('Total Spend', ascending=False).head(10)
-
-fig_supplier = go.Figure()
-
-fig_supplier.add_trace(go.Bar(
-    name='Total Spend',
-    x=supplier_metrics['Supplier'],
-    y=supplier_metrics['Total Spend'],
-    marker_color='#a8c0ff'
-))
-
-fig_supplier.add_trace(go.Scatter(
-    name='Reliability Score',
-    x=supplier_metrics['Supplier'],
-    y=supplier_metrics['Reliability %'],
-    yaxis='y2',
-    mode='markers+lines',
-    marker=dict(size=12, color='#5dae8b', line=dict(width=2, color='white'))
-))
-
-fig_supplier.update_layout(
-    title='Top 10 Suppliers by Spend vs Reliability',
-    xaxis_title='Supplier',
-    yaxis_title='Total Spend ($)',
-    yaxis2=dict(
-        title='Reliability Score (%)',
-        overlaying='y',
-        side='right',
-        range=[70, 100]
-    ),
-    hovermode='x unified',
-    height=400
-)
-
-st.plotly_chart(fig_supplier, use_container_width=True)
+        st.plotly_chart(fig_turnover, use_container_width=True)
 
-# Supplier table - format values manually
-supplier_metrics['Total Spend'] = supplier_metrics['Total Spend'].apply(lambda x: f'${x:,.0f}')
-supplier_metrics['Reliability %'] = supplier_metrics['Reliability %'].apply(lambda x: f'{x:.1f}%')
-supplier_metrics['Defect %'] = supplier_metrics['Defect %'].apply(lambda x: f'{x:.2f}%')
-supplier_metrics['Avg Lead Time (days)'] = supplier_metrics['Avg Lead Time (days)'].apply(lambda x: f'{x:.0f}')
+        st.info("Higher turnover = faster inventory movement = better efficiency")
 
-st.dataframe(supplier_metrics, use_container_width=True, hide_index=True)
 
-st.markdown("---")
+@st.fragment
+def stockout_view():
+    """Where stockouts happened and what they cost."""
+    st.subheader("Stockout Impact Analysis")
 
-# ========== REORDER ALERTS ==========
-st.subheader("Reorder Priority Dashboard")
+    stockout_analysis = compute_panel('stockout')
 
-reorder_needed = current_inventory_enhanced[
-    current_inventory_enhanced['quantity_on_hand'] <= current_inventory_enhanced['reorder_point']
-].copy()
+    col1, col2 = st.columns(2)
 
-if len(reorder_needed) > 0:
-    reorder_needed['urgency_score'] = (
-        (reorder_needed['reorder_point'] - reorder_needed['quantity_on_hand']) / 
-        reorder_needed['reorder_point'] * 100
-    )
-    reorder_needed['priority'] = pd.cut(
-        reorder_needed['urgency_score'],
-        bins=[-np.inf, 50, 80, np.inf],
-        labels=['Medium', 'High', 'Critical']
-    )
-    
-    priority_counts = reorder_needed['priority'].value_counts()
-    
-    col1, col2, col3 = st.columns(3)
-    
     with col1:
-        critical_count = priority_counts.get('Critical', 0)
-        st.metric("Critical Priority", critical_count, 
-                  delta="Immediate Action Required" if critical_count > 0 else "None",
-                  delta_color="inverse")
-    
+        fig_stockout_store = px.bar(
+            stockout_analysis.groupby('store_name', observed=True)['stockout_days'].sum().sort_values(ascending=False).reset_index(),
+            x='stockout_days',
+            y='store_name',
+            orientation='h',
+            title='Stockout Days by Store',
+            labels={'stockout_days': 'Total Stockout Days', 'store_name': 'Store'},
+            color='stockout_days',
+            color_continuous_scale='Reds'
+        )
+        st.plotly_chart(fig_stockout_store, use_container_width=True)
+
     with col2:
-        high_count = priority_counts.get('High', 0)
-        st.metric("High Priority", high_count,
-                  delta="Order Within 48hrs" if high_count > 0 else "None")
-    
-    with col3:
-        medium_count = priority_counts.get('Medium', 0)
-        st.metric("Medium Priority", medium_count,
-                  delta="Order This Week" if medium_count > 0 else "None")
-    
-    # Show top reorder items - format manually
-    top_reorders = reorder_needed.nlargest(10, 'urgency_score')[
-        ['store_name', 'product_name', 'department', 'quantity_on_hand', 
-         'reorder_point', 'urgency_score', 'priority']
-    ].copy()
-    
-    # Format numeric columns
-    top_reorders['quantity_on_hand'] = top_reorders['quantity_on_hand'].apply(lambda x: f'{x:.0f}')
-    top_reorders['reorder_point'] = top_reorders['reorder_point'].apply(lambda x: f'{x:.0f}')
-    top_reorders['urgency_score'] = top_reorders['urgency_score'].apply(lambda x: f'{x:.1f}%')
-    
-    st.dataframe(top_reorders, use_container_width=True, hide_index=True)
-else:
-    st.success("All items adequately stocked! No reorders needed.")
+        total_lost_revenue = stockout_analysis['estimated_lost_revenue'].sum()
 
-st.markdown("---")
+        fig_stockout_dept = px.pie(
+            stockout_analysis.groupby('department', observed=True)['estimated_lost_revenue'].sum().reset_index(),
+            values='estimated_lost_revenue',
+            names='department',
+            title=f'Estimated Lost Revenue: ${total_lost_revenue:,.0f}',
+            color_discrete_sequence=['#FFB6C1', '#B0E0E6', '#98D8C8', '#F7DC6F']
+        )
+        st.plotly_chart(fig_stockout_dept, use_container_width=True)
 
-# ========== SALES TRENDS ==========
-st.subheader("Sales Performance Trends")
 
-daily_sales = sales_enhanced.groupby('date').agg({
-    'revenue': 'sum',
-    'profit': 'sum',
-    'transaction_id': 'count'
-}).reset_index()
+@st.fragment
+def supplier_view():
+    """Supplier spend against reliability."""
+    st.subheader("Supplier Performance Scorecard")
 
-daily_sales.columns = ['Date', 'Revenue', 'Profit', 'Transactions']
+    supplier_metrics = compute_panel('supplier')
 
-fig_trends = make_subplots(
-    rows=2, cols=1,
-    subplot_titles=('Daily Revenue & Profit', 'Transaction Volume'),
-    vertical_spacing=0.15
-)
+    fig_supplier = go.Figure()
 
-fig_trends.add_trace(
-    go.Scatter(x=daily_sales['Date'], y=daily_sales['Revenue'], 
-               name='Revenue', line=dict(color='#a8c0ff', width=2)),
-    row=1, col=1
-)
+    fig_supplier.add_trace(go.Bar(
+        name='Total Spend',
+        x=supplier_metrics['Supplier'],
+        y=supplier_metrics['Total Spend'],
+        marker_color='#a8c0ff'
+    ))
 
-fig_trends.add_trace(
-    go.Scatter(x=daily_sales['Date'], y=daily_sales['Profit'], 
-               name='Profit', line=dict(color='#5dae8b', width=2)),
-    row=1, col=1
-)
+    fig_supplier.add_trace(go.Scatter(
+        name='Reliability Score',
+        x=supplier_metrics['Supplier'],
+        y=supplier_metrics['Reliability %'],
+        yaxis='y2',
+        mode='markers+lines',
+        marker=dict(size=12, color='#5dae8b', line=dict(width=2, color='white'))
+    ))
 
-fig_trends.add_trace(
-    go.Bar(x=daily_sales['Date'], y=daily_sales['Transactions'], 
-           name='Transactions', marker_color='#e59866'),
-    row=2, col=1
-)
+    fig_supplier.update_layout(
+        title='Top 10 Suppliers by Spend vs Reliability',
+        xaxis_title='Supplier',
+        yaxis_title='Total Spend ($)',
+        yaxis2=dict(
+            title='Reliability Score (%)',
+            overlaying='y',
+            side='right',
+            range=[70, 100]
+        ),
+        hovermode='x unified',
+        height=400
+    )
+
+    st.plotly_chart(fig_supplier, use_container_width=True)
+
+    # Supplier table - format values manually (on a copy; the metrics are cached)
+    supplier_table = supplier_metrics.copy()
+    supplier_table['Total Spend'] = supplier_table['Total Spend'].apply(lambda x: f'${x:,.0f}')
+    supplier_table['Reliability %'] = supplier_table['Reliability %'].apply(lambda x: f'{x:.1f}%')
+    supplier_table['Defect %'] = supplier_table['Defect %'].apply(lambda x: f'{x:.2f}%')
+    supplier_table['Avg Lead Time (days)'] = supplier_table['Avg Lead Time (days)'].apply(lambda x: f'{x:.0f}')
+
+    st.dataframe(supplier_table, use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def reorder_view():
+    """What to order now, and what will run out next."""
+    st.subheader("Reorder Priority Dashboard")
+
+    reorder_needed = compute_panel('reorder')
+
+    if len(reorder_needed) > 0:
+        priority_counts = reorder_needed['priority'].value_counts()
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            critical_count = priority_counts.get('Critical', 0)
+            st.metric("Critical Priority", critical_count, 
+                      delta="Immediate Action Required" if critical_count > 0 else "None",
+                      delta_color="inverse")
+
+        with col2:
+            high_count = priority_counts.get('High', 0)
+            st.metric("High Priority", high_count,
+                      delta="Order Within 48hrs" if high_count > 0 else "None")
+
+        with col3:
+            medium_count = priority_counts.get('Medium', 0)
+            st.metric("Medium Priority", medium_count,
+                      delta="Order This Week" if medium_count > 0 else "None")
+
+        # Narrowing the table reruns this view only
+        shown = st.pills("Show priorities", PRIORITIES[::-1], selection_mode='multi',
+                         default=PRIORITIES[::-1], key='reorder_priorities')
+        shown_reorders = reorder_needed[reorder_needed['priority'].isin(shown)]
+
+        # Show top reorder items - format manually
+        top_reorders = shown_reorders.sort_values(['priority', 'urgency_score'], ascending=False).head(10)[
+            ['store_name', 'product_name', 'department', 'quantity_on_hand', 'on_order',
+             'reorder_point', 'days_of_cover', 'lead_time_days', 'urgency_score', 'priority']
+        ].copy()
+
+        # Format numeric columns
+        top_reorders['quantity_on_hand'] = top_reorders['quantity_on_hand'].apply(lambda x: f'{x:.0f}')
+        top_reorders['on_order'] = top_reorders['on_order'].apply(lambda x: f'{x:.0f}')
+        top_reorders['reorder_point'] = top_reorders['reorder_point'].apply(lambda x: f'{x:.0f}')
+        top_reorders['days_of_cover'] = top_reorders['days_of_cover'].apply(lambda x: f'{x:.1f}')
+        top_reorders['lead_time_days'] = top_reorders['lead_time_days'].apply(lambda x: f'{x:.0f}')
+        top_reorders['urgency_score'] = top_reorders['urgency_score'].apply(lambda x: f'{x:.1f}%')
+
+        st.dataframe(top_reorders, use_container_width=True, hide_index=True)
+    else:
+        st.success("All items adequately stocked! No reorders needed.")
+
+    st.markdown("---")
+
+    st.subheader("Projected Stockouts")
+
+    projected = compute_panel('forecast')
+    st.caption(f"Forecast demand from {max_date:%Y-%m-%d} against stock on hand and open "
+               f"purchase orders; the date range filter does not apply.")
+
+    if len(projected) > 0:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig_projected = px.histogram(
+                projected,
+                x='projected_stockout',
+                color='department',
+                title='Projected Stockouts by Date',
+                labels={'projected_stockout': 'Projected Stockout Date'},
+                color_discrete_sequence=['#FFB6C1', '#B0E0E6', '#98D8C8', '#F7DC6F']
+            )
+            st.plotly_chart(fig_projected, use_container_width=True)
+
+        with col2:
+            overdue = (projected['order_by'].dt.date <= max_date).sum()
+            st.metric("Pairs Running Out", len(projected))
+            st.metric("Past Order-By Date", overdue,
+                      delta="Order Now" if overdue > 0 else "None",
+                      delta_color="inverse")
+
+        soonest = projected.head(10)[
+            ['store_name', 'product_name', 'department', 'quantity_on_hand', 'daily_forecast',
+             'projected_stockout', 'order_by']
+        ].copy()
+        soonest['quantity_on_hand'] = soonest['quantity_on_hand'].apply(lambda x: f'{x:.0f}')
+        soonest['daily_forecast'] = soonest['daily_forecast'].apply(lambda x: f'{x:.1f}')
+        soonest['projected_stockout'] = soonest['projected_stockout'].dt.strftime('%Y-%m-%d')
+        soonest['order_by'] = soonest['order_by'].dt.strftime('%Y-%m-%d')
+
+        st.dataframe(soonest, use_container_width=True, hide_index=True)
+    else:
+        st.success("No stockouts projected within the forecast horizon.")
+
+
+@st.fragment
+def trends_view():
+    """Daily revenue, profit and transaction volume."""
+    st.subheader("Sales Performance Trends")
+
+    daily_sales = compute_panel('trends')
+
+    # Long ranges are totalled per week or month, and each trace is capped
+    # at what the chart width can show
+    trend, period = resample_trends(daily_sales)
+    max_points = points_for_width(CHART_WIDTH_PX)
+
+    fig_trends = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=(f'{period} Revenue & Profit', f'{period} Transaction Volume'),
+        vertical_spacing=0.15
+    )
+
+    revenue = thin_line(trend, 'Date', 'Revenue', max_points)
+    fig_trends.add_trace(
+        go.Scatter(x=revenue['Date'], y=revenue['Revenue'],
+                   name='Revenue', line=dict(color='#a8c0ff', width=2)),
+        row=1, col=1
+    )
+
+    profit = thin_line(trend, 'Date', 'Profit', max_points)
+    fig_trends.add_trace(
+        go.Scatter(x=profit['Date'], y=profit['Profit'],
+                   name='Profit', line=dict(color='#5dae8b', width=2)),
+        row=1, col=1
+    )
+
+    transactions = thin_bars(trend, 'Transactions', max_points)
+    fig_trends.add_trace(
+        go.Bar(x=transactions['Date'], y=transactions['Transactions'],
+               name='Transactions', marker_color='#e59866'),
+        row=2, col=1
+    )
+
+    fig_trends.update_xaxes(title_text="Date", row=2, col=1)
+    fig_trends.update_yaxes(title_text="Amount ($)", row=1, col=1)
+    fig_trends.update_yaxes(title_text="Count", row=2, col=1)
+
+    fig_trends.update_layout(height=600, showlegend=True, hovermode='x unified')
+
+    st.plotly_chart(fig_trends, use_container_width=True)
 
-fig_trends.update_xaxes(title_text="Date", row=2, col=1)
-fig_trends.update_yaxes(title_text="Amount ($)", row=1, col=1)
-fig_trends.update_yaxes(title_text="Count", row=2, col=1)
 
-fig_trends.update_layout(height=600, showlegend=True, hovermode='x unified')
+# View name -> (profiler section, renderer)
+VIEWS = {
+    'Inventory Health': ('heatmap', inventory_health_view),
+    'ABC & Turnover': ('abc_turnover', abc_turnover_view),
+    'Stockouts': ('stockout', stockout_view),
+    'Suppliers': ('supplier', supplier_view),
+    'Reorders': ('reorder', reorder_view),
+    'Trends': ('trends', trends_view)
+}
 
-st.plotly_chart(fig_trends, use_container_width=True)
+view = st.segmented_control("View", list(VIEWS), default='Inventory Health', key='view') or 'Inventory Health'
+section, render_view = VIEWS[view]
+profiler.lap(section)
+render_view()
 
 st.markdown("---")
+profiler.close()
 
 # Footer
 st.markdown("""
 <div style='text-align: center; color: #666; padding: 20px;'>
     <p>Advanced Retail Analytics Dashboard | Built with Streamlit</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+with st.sidebar.expander("Panel Cache"):
+    cache_stats = panel_cache.stats()
+    st.dataframe(cache_stats, hide_index=True)
+    st.caption(f"{len(panel_cache)} cached results, {panel_cache.evictions} evicted")
+
+st.sidebar.checkbox("Profile this run", value=PROFILE_DEFAULT, key='profile',
+                    help="Time each section and trace its memory allocations (slows reruns down)")
+
+if profiler.enabled:
+    with st.expander("Profile", expanded=True):
+        profile_df = profiler.report()
+        top_sections = profile_df[profile_df['depth'] == 0]
+        st.caption(f"Total {top_sections['ms'].sum():,.0f} ms, peak traced memory {profiler.peak_mb:,.1f} MB")
+
+        fig_profile = px.bar(
+            top_sections, x='ms', y='section', orientation='h',
+            title='Time per Section', labels={'ms': 'Time (ms)', 'section': 'Section'}
+        )
+        fig_profile.update_layout(height=350, yaxis={'categoryorder': 'array', 'categoryarray': top_sections['section'][::-1]})
+        st.plotly_chart(fig_profile, use_container_width=True)
+
+        st.dataframe(profile_df.style.format({'start_ms': '{:,.1f}', 'ms': '{:,.1f}', 'alloc_mb': '{:+,.2f}', 'share_pct': '{:.1f}'}),
+                     hide_index=True, use_container_width=True)
+        st.download_button("Download trace (JSON)",
+                           profiler.to_json(filters=asdict(filters), data_dir=DATA_DIR),
+                           file_name='retail_profile.json', mime='application/json')
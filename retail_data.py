@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Storage layer shared by the data generator and the dashboard.
+
+Tables are stored either as one CSV file per table (the original layout) or
+as Parquet: a single file per dimension table and a directory of date
+partitions for the inventory and sales fact tables.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Table name -> file stem in the data directory
+TABLES = {
+    'stores': 'retail_stores',
+    'products': 'retail_products',
+    'suppliers': 'retail_suppliers',
+    'inventory': 'retail_inventory',
+    'sales': 'retail_sales',
+    'purchase_orders': 'retail_purchase_orders'
+}
+
+# Fact tables are written in chunks of whole days
+PARTITIONED_TABLES = ('inventory', 'sales')
+
+DATE_COLUMNS = {
+    'inventory': ['date'],
+    'sales': ['date'],
+    'purchase_orders': ['order_date', 'expected_delivery']
+}
+
+FORMATS = ('csv', 'parquet')
+
+STATUS_LEVELS = ['In Stock', 'Low Stock', 'Out of Stock', 'Overstock']
+
+# In-memory dtypes applied at load time. Identifier columns become
+# categoricals whose categories come from the owning dimension table
+# ('ids:<table>'), so every table shares the same codes and joins, filters
+# and group-bys compare small integers instead of strings. Money columns that
+# get summed stay float64; ratios and small counts are downcast.
+SCHEMAS = {
+    'stores': {
+        'store_id': 'ids:stores', 'store_name': 'category', 'state': 'category', 'region': 'category',
+        'store_type': 'category', 'size_sqft': 'int32'
+    },
+    'products': {
+        'sku': 'ids:products', 'department': 'category', 'category': 'category',
+        'product_name': 'category', 'supplier_id': 'ids:suppliers', 'reorder_point': 'int16', 'reorder_quantity': 'int16',
+        'lead_time_days': 'int16', 'shelf_life_days': 'float32', 'weight_kg': 'float32'
+    },
+    'suppliers': {
+        'supplier_id': 'ids:suppliers', 'country': 'category', 'reliability_score': 'float32',
+        'avg_lead_time': 'int16', 'defect_rate': 'float32'
+    },
+    'inventory': {
+        'store_id': 'ids:stores', 'sku': 'ids:products', 'quantity_on_hand': 'int32',
+        'quantity_sold': 'int16', 'status': 'status', 'days_of_supply': 'int16'
+    },
+    'sales': {
+        'store_id': 'ids:stores', 'sku': 'ids:products', 'quantity': 'int16',
+        'profit_margin': 'float32'
+    },
+    'purchase_orders': {
+        'store_id': 'ids:stores', 'sku': 'ids:products', 'supplier_id': 'ids:suppliers',
+        'order_quantity': 'int32', 'status': 'category'
+    }
+}
+
+# Key column of each dimension table referenced by 'ids:<table>'
+ID_COLUMNS = {'stores': 'store_id', 'products': 'sku', 'suppliers': 'supplier_id'}
+
+# Dimension attributes denormalized onto each fact table at load time
+FACT_DIMENSIONS = {
+    'inventory': {
+        'products': ['department', 'category', 'product_name', 'cost', 'reorder_point'],
+        'stores': ['store_name', 'region']
+    },
+    'sales': {
+        'products': ['department', 'category'],
+        'stores': ['store_name', 'region']
+    }
+}
+
+# Sort order of the fact tables
+FACT_ORDER = ['date', 'store_id', 'sku']
+
+
+def table_path(data_dir, table, fmt):
+    """Return the file (or partition directory) holding ``table`` in format ``fmt``."""
+    stem = TABLES[table]
+    if fmt == 'parquet':
+        return Path(data_dir) / (stem if table in PARTITIONED_TABLES else f'{stem}.parquet')
+    return Path(data_dir) / f'{stem}.csv'
+
+
+def detect_format(data_dir):
+    """Prefer Parquet when a partitioned inventory directory exists, else CSV."""
+    return 'parquet' if table_path(data_dir, 'inventory', 'parquet').is_dir() else 'csv'
+
+
+def read_table(data_dir, table, columns=None, fmt=None, limit=None):
+    """Read one table, projecting ``columns`` and returning parsed date columns.
+
+    Parquet reads only the requested column chunks; CSV still has to scan the
+    file but skips converting unused columns. ``limit`` bounds the read of a
+    table that is being appended to: the number of CSV rows, or the names of
+    the Parquet partition files to read.
+    """
+    fmt = fmt or detect_format(data_dir)
+    path = table_path(data_dir, table, fmt)
+
+    if fmt == 'parquet':
+        if limit is not None:
+            path = [path / name for name in limit]
+        return pd.read_parquet(path, columns=columns)
+
+    return parse_dates(pd.read_csv(path, usecols=columns, nrows=limit), table)
+
+
+def read_table_chunks(data_dir, table, fmt=None, chunk_rows=1_000_000):
+    """Yield ``table`` in pieces: ``chunk_rows`` CSV rows or one Parquet partition file at a time."""
+    fmt = fmt or detect_format(data_dir)
+    path = table_path(data_dir, table, fmt)
+    if fmt == 'parquet':
+        for part in sorted(path.glob('part-*.parquet')) if path.is_dir() else [path]:
+            yield pd.read_parquet(part)
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            yield parse_dates(chunk, table)
+
+
+def parse_dates(df, table):
+    """Convert the ISO date strings of a CSV-read ``table`` to datetimes, in place."""
+    for col in DATE_COLUMNS.get(table, []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='%Y-%m-%d')
+    return df
+
+
+def load_tables(data_dir='.', columns=None, fmt=None, limits=None):
+    """Load all six tables as a dict keyed by table name.
+
+    ``columns`` maps table name to the list of columns to read; tables not
+    listed are read in full. ``limits`` maps table name to a ``read_table``
+    limit.
+    """
+    columns, limits = columns or {}, limits or {}
+    fmt = fmt or detect_format(data_dir)
+    tables = {table: read_table(data_dir, table, columns.get(table), fmt, limits.get(table)) for table in TABLES}
+    return apply_schema(tables)
+
+
+def schema_categories(tables):
+    """Categorical dtypes for the ``'ids:<table>'`` and ``'status'`` schema entries.
+
+    Id categories come from the dimension tables in ``tables``; dimensions that
+    were already typed keep their dtype, so rows loaded later share its codes.
+    """
+    categories = {}
+    for dim, col in ID_COLUMNS.items():
+        if dim in tables:
+            ids = tables[dim][col]
+            categories[f'ids:{dim}'] = (ids.dtype if isinstance(ids.dtype, pd.CategoricalDtype)
+                                        else pd.CategoricalDtype(pd.unique(ids.astype(str))))
+    categories['status'] = pd.CategoricalDtype(STATUS_LEVELS)
+    return categories
+
+
+def apply_schema(tables, categories=None):
+    """Cast every table in ``tables`` to its declared compact dtypes, in place.
+
+    ``categories`` defaults to ``schema_categories(tables)``; pass the
+    categories of an already-loaded dataset to type rows appended to it.
+    """
+    categories = categories or schema_categories(tables)
+    for table, df in tables.items():
+        for col, dtype in SCHEMAS.get(table, {}).items():
+            if col in df.columns:
+                df[col] = df[col].astype(categories.get(dtype, dtype))
+    return tables
+
+
+def denormalize(fact, dim, key, columns):
+    """Copy ``columns`` of ``dim`` onto ``fact`` by gathering on the ``key`` codes.
+
+    Both key columns are categoricals over the same ids (see ``apply_schema``),
+    so this is a positional take per fact row instead of a hash join.
+    """
+    positions = pd.Index(dim[key].astype(str)).get_indexer(fact[key].cat.categories.astype(str))
+    taker = np.where(fact[key].cat.codes.to_numpy() >= 0, positions[fact[key].cat.codes.to_numpy()], -1)
+    for col in columns:
+        fact[col] = dim[col].array.take(taker, allow_fill=True)
+    return fact
+
+
+def build_fact_table(fact, tables, table):
+    """Sort a fact table by (date, store_id, sku) and attach its dimension attributes."""
+    fact = fact.sort_values(FACT_ORDER, kind='stable', ignore_index=True)
+    for dim, columns in FACT_DIMENSIONS[table].items():
+        denormalize(fact, tables[dim], ID_COLUMNS[dim], columns)
+    return fact
+
+
+class DateIndex:
+    """Row offsets of each distinct date in a date-sorted table.
+
+    ``days[i]`` starts at row ``offsets[i]``, and ``offsets[-1]`` is the row
+    count, so any date range maps to one contiguous ``iloc`` slice found with
+    two binary searches over the distinct days.
+    """
+
+    def __init__(self, dates):
+        values = np.asarray(dates, dtype='datetime64[D]')
+        starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]]) if len(values) else np.array([], int)
+        self.days = values[starts]
+        self.offsets = np.append(starts, len(values))
+
+    def bounds(self, start, end):
+        """Return the ``(lo, hi)`` row range covering dates ``start``..``end`` inclusive."""
+        lo = np.searchsorted(self.days, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.days, np.datetime64(end, 'D'), side='right')
+        return int(self.offsets[lo]), int(self.offsets[max(lo, hi)])
+
+    def slice(self, df, start, end):
+        lo, hi = self.bounds(start, end)
+        return df.iloc[lo:hi]
+
+    def position(self, date):
+        """Index into ``days`` of the first day on or after ``date``."""
+        return int(np.searchsorted(self.days, np.datetime64(date, 'D'), side='left'))
+
+    def splice(self, position, tail):
+        """Index of this table's rows before day ``position`` followed by the rows indexed by ``tail``."""
+        spliced = DateIndex([])
+        spliced.days = np.concatenate([self.days[:position], tail.days])
+        spliced.offsets = np.concatenate([self.offsets[:position], tail.offsets + self.offsets[position]])
+        return spliced
+
+
+@dataclass(eq=False)
+class RetailDataset:
+    """The loaded tables, with inventory and sales as pre-joined, sorted fact tables.
+
+    Instances are shared between dashboard sessions, so treat the frames as
+    read-only. They hash by identity, which lets per-dataset results be
+    memoized. ``data_dir`` is the directory the tables were loaded from, where
+    derived files such as the forecast cache are kept.
+    """
+    stores: pd.DataFrame
+    products: pd.DataFrame
+    suppliers: pd.DataFrame
+    inventory: pd.DataFrame
+    sales: pd.DataFrame
+    purchase_orders: pd.DataFrame
+    inventory_index: DateIndex = None
+    sales_index: DateIndex = None
+    data_dir: str = None
+
+    def __post_init__(self):
+        if self.inventory_index is None:
+            self.inventory_index = DateIndex(self.inventory['date'])
+        if self.sales_index is None:
+            self.sales_index = DateIndex(self.sales['date'])
+
+    @property
+    def tables(self):
+        return {table: getattr(self, table) for table in TABLES}
+
+    @property
+    def days(self):
+        """Distinct inventory snapshot dates, ascending."""
+        return self.inventory_index.days
+
+
+def load_dataset(data_dir='.', columns=None, fmt=None, limits=None):
+    """Load all tables and build the inventory and sales fact tables once."""
+    tables = load_tables(data_dir, columns, fmt, limits)
+    for table in FACT_DIMENSIONS:
+        tables[table] = build_fact_table(tables[table], tables, table)
+    return RetailDataset(**tables, data_dir=str(data_dir))
+
+
+def memory_report(tables):
+    """Return rows and deep in-memory size per table, largest first."""
+    report = pd.DataFrame({
+        'Table': list(tables),
+        'Rows': [len(df) for df in tables.values()],
+        'Memory (MB)': [df.memory_usage(deep=True).sum() / 1024 ** 2 for df in tables.values()]
+    })
+    return report.sort_values('Memory (MB)', ascending=False, ignore_index=True)
+
+
+def required_columns(panel_columns):
+    """Union per-panel ``{table: [columns]}`` specs into one projection per table."""
+    columns = {}
+    for spec in panel_columns.values():
+        for table, cols in spec.items():
+            merged = columns.setdefault(table, [])
+            merged.extend(col for col in cols if col not in merged)
+    return columns
+
+
+def write_table(df, data_dir, table, fmt):
+    """Write a small (dimension or PO) table in one piece."""
+    path = table_path(data_dir, table, fmt)
+    if fmt == 'parquet':
+        df = df.copy()
+        for col in DATE_COLUMNS.get(table, []):
+            df[col] = pd.to_datetime(df[col])
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+class CsvTableWriter:
+    """Append frames to a single CSV file, writing the header with the first chunk."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = 0
+
+    def write(self, df):
+        df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+
+class ParquetTableWriter:
+    """Write each chunk as its own Parquet file in a partition directory.
+
+    Files are named after the first date in the chunk so a lexical listing is
+    in date order, and rows within a file are date-ordered, which keeps the
+    row-group statistics on ``date`` tight.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for stale in self.path.glob('part-*.parquet'):
+            stale.unlink()
+        self.rows = 0
+
+    def write(self, df):
+        if df.empty:
+            return
+        first_date = pd.Timestamp(df['date'].iloc[0]).strftime('%Y-%m-%d')
+        df.to_parquet(self.path / f'part-{first_date}.parquet', index=False)
+        self.rows += len(df)
+
+
+def table_writer(data_dir, table, fmt):
+    """Return a chunked writer for one of the fact tables."""
+    path = table_path(data_dir, table, fmt)
+    return ParquetTableWriter(path) if fmt == 'parquet' else CsvTableWriter(path)
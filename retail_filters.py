@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Dashboard filter state and the bitmap index that resolves it.
+
+Each filter field is a multi-select: the values picked within a field are
+ORed, and the fields are ANDed. Store fields (store, region, store type)
+resolve to a set of stores and product fields (department, category) to a
+set of SKUs, each a boolean bitmap over the codes of the shared ``store_id``
+or ``sku`` categorical. Those codes are also the codes of the fact tables'
+id columns and the rows and columns of the reorder grid, so a filter of any
+combination is a few ORs and ANDs over a few hundred (or thousand) bits,
+then one gather by code over the rows to filter.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Filter field -> column of the stores / products table it selects on
+STORE_FIELDS = {'store_ids': 'store_id', 'regions': 'region', 'store_types': 'store_type'}
+PRODUCT_FIELDS = {'departments': 'department', 'categories': 'category'}
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar filter state; an empty selection means no restriction. Hashable, so usable as a cache key.
+
+    Selections are normalized to sorted tuples of strings, so the same
+    choice made in any order hits the same cache entries.
+    """
+    start: date = None
+    end: date = None
+    store_ids: tuple = ()
+    regions: tuple = ()
+    store_types: tuple = ()
+    departments: tuple = ()
+    categories: tuple = ()
+
+    def __post_init__(self):
+        for field in (*STORE_FIELDS, *PRODUCT_FIELDS):
+            object.__setattr__(self, field, tuple(sorted({str(value) for value in getattr(self, field)})))
+
+    def selected(self, fields):
+        """``{column: values}`` of the non-empty selections among ``fields``."""
+        return {column: getattr(self, field) for field, column in fields.items() if getattr(self, field)}
+
+
+class FilterIndex:
+    """Bitmaps of the stores and SKUs carrying each value of the filterable dimension columns.
+
+    ``bitmaps[column][value]`` is a boolean array over the codes of the
+    dimension's id column, and ``ids[key]`` the ids those codes stand for.
+    """
+
+    def __init__(self, stores, products):
+        self.ids, self.bitmaps = {}, {}
+        for dim, key, fields in ((stores, 'store_id', STORE_FIELDS), (products, 'sku', PRODUCT_FIELDS)):
+            codes = dim[key].cat.codes.to_numpy()
+            self.ids[key] = dim[key].cat.categories
+            for column in fields.values():
+                values = dim[column].astype(str).to_numpy()
+                bitmaps = self.bitmaps[column] = {}
+                for value in np.unique(values):
+                    bitmaps[value] = np.zeros(len(self.ids[key]), dtype=bool)
+                    bitmaps[value][codes[values == value]] = True
+
+    def _members(self, key, selected):
+        members = None
+        for column, values in selected.items():
+            hit = np.zeros(len(self.ids[key]), dtype=bool)
+            for value in values:
+                hit |= self.bitmaps[column].get(value, False)
+            members = hit if members is None else members & hit
+        return members
+
+    def stores(self, filters):
+        """Bitmap over store codes of the stores matching ``filters``, or None for all."""
+        return self._members('store_id', filters.selected(STORE_FIELDS))
+
+    def products(self, filters):
+        """Bitmap over SKU codes of the products matching ``filters``, or None for all."""
+        return self._members('sku', filters.selected(PRODUCT_FIELDS))
+
+    def store_ids(self, filters):
+        """Ids of the stores matching ``filters``, or None for all."""
+        stores = self.stores(filters)
+        return None if stores is None else self.ids['store_id'][stores].tolist()
+
+    def _codes(self, key, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return column.cat.codes.to_numpy()
+        return self.ids[key].get_indexer(column.astype(str))
+
+    def rows(self, frame, filters):
+        """Boolean mask of the rows of ``frame`` matching ``filters``, or None when nothing is filtered.
+
+        Rows are matched on their ``store_id`` / ``sku`` codes through the
+        bitmaps; frames without ``sku`` (the store x department x category
+        rollups) are matched on their own product columns.
+        """
+        mask = None
+        for key, fields, members in (('store_id', STORE_FIELDS, self.stores), ('sku', PRODUCT_FIELDS, self.products)):
+            selected = filters.selected(fields)
+            if not selected:
+                continue
+            if key in frame:
+                # Code -1 (unknown id) picks the appended False
+                hits = [np.append(members(filters), False)[self._codes(key, frame[key])]]
+            else:
+                hits = [np.append(frame[column].cat.categories.isin(values), False)[frame[column].cat.codes.to_numpy()]
+                        for column, values in selected.items()]
+            for hit in hits:
+                mask = hit if mask is None else mask & hit
+        return mask
+
+    def select(self, frame, filters):
+        """Rows of ``frame`` matching ``filters``."""
+        mask = self.rows(frame, filters)
+        return frame if mask is None else frame[mask]
+
+
+@lru_cache(maxsize=2)
+def filter_index(data):
+    """``FilterIndex`` of a loaded dataset (or database), built once per object."""
+    return FilterIndex(data.stores, data.products)
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Batch demand forecasting and projected stockout dates.
+
+Daily ``quantity_sold`` of every store x SKU pair is forecast with simple
+exponential smoothing, fitted in vectorized form: one pass over the days
+updates the level of every pair at once. Seasonal SKUs (``is_seasonal``) are
+smoothed on a deseasonalized series, using a month-of-year index estimated
+from their demand relative to non-seasonal SKUs, and re-seasonalized when
+projecting.
+
+Pairs are fitted in chunks of whole stores, optionally on a process pool,
+and the fitted levels are cached next to the data (``retail_forecast.npz``)
+under a fingerprint of the history's content, so the dashboard only refits
+when new data arrives:
+
+    python retail_forecast.py --data-dir . --workers 4
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from retail_data import load_dataset
+from retail_reorder import reorder_engine
+
+# Smoothing factor of the level update
+ALPHA = 0.3
+
+# Days ahead projected for stockouts
+HORIZON = 60
+
+# Store x SKU pairs per fitting task
+CHUNK_PAIRS = 200_000
+
+DEFAULT_CACHE_NAME = 'retail_forecast.npz'
+
+# Fitting processes used when the dashboard has to refit
+FORECAST_WORKERS = int(os.environ.get('RETAIL_FORECAST_WORKERS', 1))
+
+
+@dataclass
+class Forecast:
+    """Fitted demand levels of every store x SKU pair as of the last history day."""
+    as_of: np.datetime64
+    level: np.ndarray
+    seasonal_index: np.ndarray
+    is_seasonal: np.ndarray
+    fingerprint: str
+
+    def daily_demand(self, day):
+        """Dense ``(stores, skus)`` forecast of units sold on ``day`` (NaN where never stocked)."""
+        month = pd.Timestamp(day).month - 1
+        return self.level * np.where(self.is_seasonal, self.seasonal_index[month], 1.0)
+
+    def save(self, path):
+        """Write to exactly ``path`` (any suffix), through a temporary file renamed into place."""
+        path = Path(path)
+        fd, partial = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+        try:
+            # Writing to a file object stops numpy from appending '.npz' to the name
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, as_of=self.as_of, level=self.level, seasonal_index=self.seasonal_index,
+                         is_seasonal=self.is_seasonal, fingerprint=self.fingerprint)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.unlink(partial)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(as_of=f['as_of'][()], level=f['level'], seasonal_index=f['seasonal_index'],
+                       is_seasonal=f['is_seasonal'], fingerprint=str(f['fingerprint']))
+
+
+# ========== HISTORY ==========
+class FrameHistory:
+    """Sales history of an in-memory ``RetailDataset``, served as arrays per range of stores."""
+
+    def __init__(self, data):
+        self.data = data
+        self.days = data.days
+        self.rows = len(data.inventory)
+        self.shape = (len(data.stores), len(data.products))
+
+    def digest(self):
+        """Hash of the ids, days and per-row store, SKU and units sold the forecast is fitted on."""
+        inventory, index = self.data.inventory, self.data.inventory_index
+        digest = hashlib.blake2b(digest_size=16)
+        for ids in (self.data.stores['store_id'], self.data.products['sku']):
+            digest.update('\0'.join(ids.astype(str)).encode())
+        for values in (self.data.products['is_seasonal'].to_numpy(bool), index.days, index.offsets,
+                       inventory['store_id'].cat.codes.to_numpy(), inventory['sku'].cat.codes.to_numpy(),
+                       inventory['quantity_sold'].to_numpy()):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+    def monthly_totals(self):
+        """``(12, skus)`` units sold and row counts per month of year and SKU."""
+        inventory = self.data.inventory
+        keys = (inventory['date'].dt.month.to_numpy() - 1) * self.shape[1] + inventory['sku'].cat.codes.to_numpy()
+        sold = np.bincount(keys, weights=inventory['quantity_sold'].to_numpy('float64'), minlength=12 * self.shape[1])
+        rows = np.bincount(keys, minlength=12 * self.shape[1])
+        return sold.reshape(12, -1), rows.reshape(12, -1)
+
+    def chunks(self, store_ranges):
+        """Yield ``(day_idx, sku_idx, store_idx - lo, quantity_sold)`` for each ``(lo, hi)`` store range."""
+        inventory, index = self.data.inventory, self.data.inventory_index
+        store_codes = inventory['store_id'].cat.codes.to_numpy()
+        # Stable, so rows stay in date order within each store
+        order = np.argsort(store_codes, kind='stable')
+        bounds = np.searchsorted(store_codes[order], np.arange(self.shape[0] + 1))
+        day_idx = np.repeat(np.arange(len(index.days), dtype=np.int32), np.diff(index.offsets))
+        sku_codes = inventory['sku'].cat.codes.to_numpy()
+        sold = inventory['quantity_sold'].to_numpy('float32')
+        for lo, hi in store_ranges:
+            rows = order[bounds[lo]:bounds[hi]]
+            rows = rows[np.argsort(day_idx[rows], kind='stable')]
+            yield day_idx[rows], sku_codes[rows], store_codes[rows] - lo, sold[rows]
+
+
+# ========== FITTING ==========
+def seasonal_index(sold, rows, is_seasonal):
+    """Month-of-year multiplier of seasonal SKUs' demand, relative to non-seasonal SKUs.
+
+    Normalized to average 1 over the months present in the history; months
+    without history get 1.
+    """
+    def mean_per_row(mask):
+        return sold[:, mask].sum(axis=1) / np.maximum(rows[:, mask].sum(axis=1), 1)
+
+    observed = rows[:, is_seasonal].sum(axis=1) > 0
+    observed &= rows[:, ~is_seasonal].sum(axis=1) > 0
+    index = np.ones(12)
+    if observed.any():
+        ratio = mean_per_row(is_seasonal)[observed] / mean_per_row(~is_seasonal)[observed]
+        index[observed] = ratio / ratio.mean()
+    return index
+
+
+def fit_levels(day_idx, sku_idx, store_idx, sold, n_days, n_stores, n_skus, season_by_day, is_seasonal, alpha=ALPHA):
+    """Smoothed level of each pair in a block of stores, from rows sorted by day.
+
+    Pairs without a row on a day keep their level; pairs never stocked stay NaN.
+    """
+    pairs = store_idx.astype(np.int64) * n_skus + sku_idx
+    seasonal = np.tile(is_seasonal, n_stores)
+    starts = np.searchsorted(day_idx, np.arange(n_days + 1))
+
+    level = np.full(n_stores * n_skus, np.nan)
+    observed = np.empty_like(level)
+    for day in range(n_days):
+        rows = slice(starts[day], starts[day + 1])
+        observed.fill(np.nan)
+        observed[pairs[rows]] = sold[rows]
+        observed[seasonal] /= season_by_day[day]
+        has = ~np.isnan(observed)
+        level = np.where(has, np.where(np.isnan(level), observed, level + alpha * (observed - level)), level)
+    return level.reshape(n_stores, n_skus)
+
+
+def _fit_chunk(args):
+    return fit_levels(*args)
+
+
+def fit_forecast(history, products, alpha=ALPHA, workers=1):
+    """Fit a ``Forecast`` over every pair of ``history``, ``workers`` processes at a time."""
+    n_stores, n_skus = history.shape
+    n_days = len(history.days)
+    is_seasonal = products['is_seasonal'].to_numpy(bool)
+
+    index = seasonal_index(*history.monthly_totals(), is_seasonal)
+    season_by_day = index[pd.DatetimeIndex(history.days).month.to_numpy() - 1]
+
+    stores_per_chunk = max(1, CHUNK_PAIRS // max(n_skus, 1))
+    store_ranges = [(lo, min(lo + stores_per_chunk, n_stores)) for lo in range(0, n_stores, stores_per_chunk)]
+    tasks = ((*chunk, n_days, hi - lo, n_skus, season_by_day, is_seasonal, alpha)
+             for (lo, hi), chunk in zip(store_ranges, history.chunks(store_ranges)))
+
+    levels = []
+    if workers <= 1:
+        levels = [fit_levels(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(_fit_chunk, task))
+                if len(pending) >= 2 * workers:
+                    levels.append(pending.popleft().result())
+            levels.extend(future.result() for future in pending)
+
+    level = np.concatenate(levels) if levels else np.empty((0, n_skus))
+    return Forecast(as_of=history.days[-1], level=level, seasonal_index=index, is_seasonal=is_seasonal,
+                    fingerprint=fingerprint(history, alpha))
+
+
+def fingerprint(history, alpha=ALPHA):
+    """Identifies the history a forecast was fitted on, by shape and content digest."""
+    return f'{history.shape[0]}x{history.shape[1]}:{history.rows}:{alpha}:{history.digest()}'
+
+
+def cache_path(directory=None):
+    """Forecast cache file: ``RETAIL_FORECAST_CACHE``, else in ``directory`` (None: no cache)."""
+    if os.environ.get('RETAIL_FORECAST_CACHE'):
+        return Path(os.environ['RETAIL_FORECAST_CACHE'])
+    return None if directory is None else Path(directory) / DEFAULT_CACHE_NAME
+
+
+def cached_forecast(history, products, directory=None, path=None, alpha=ALPHA, workers=FORECAST_WORKERS):
+    """The cached forecast if it was fitted on this history, else a fresh fit written to the cache.
+
+    The cache is ``path``, else ``cache_path(directory)``; without either the
+    forecast is fitted and not cached.
+    """
+    path = path or cache_path(directory)
+    if path is None:
+        return fit_forecast(history, products, alpha, workers)
+    path = Path(path)
+    if path.exists():
+        try:
+            forecast = Forecast.load(path)
+            if forecast.fingerprint == fingerprint(history, alpha):
+                return forecast
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Unreadable (truncated, foreign or older format): refit over it
+            pass
+    forecast = fit_forecast(history, products, alpha, workers)
+    try:
+        forecast.save(path)
+    except OSError:
+        pass
+    return forecast
+
+
+# ========== PROJECTION ==========
+def projected_stockouts(forecast, engine, snapshot, horizon=HORIZON):
+    """Pairs whose stock on hand plus scheduled PO receipts runs out within ``horizon`` days.
+
+    ``snapshot`` holds the ``store_id``, ``sku`` and ``quantity_on_hand`` rows
+    of the forecast's as-of day.
+    """
+    day = np.datetime64(forecast.as_of, 'D')
+    pairs = engine.pair_codes(snapshot['store_id'], snapshot['sku'])
+    on_hand = engine.matrix(pairs, snapshot['quantity_on_hand'].to_numpy('float64'))
+    supply = on_hand.copy()
+    stocked = np.zeros(engine.shape, dtype=bool)
+    stocked.flat[pairs] = True
+    stocked &= ~np.isnan(forecast.level)
+
+    due_in, receipt_pairs, receipt_quantity = engine.scheduled_receipts(day, horizon)
+    demand = np.zeros(engine.shape)
+    stockout = np.full(engine.shape, -1)
+    for ahead in range(1, horizon + 1):
+        demand += np.nan_to_num(forecast.daily_demand(day + np.timedelta64(ahead, 'D')))
+        arriving = due_in == ahead
+        supply.flat[receipt_pairs[arriving]] += receipt_quantity[arriving]
+        stockout[(stockout < 0) & stocked & (demand > supply)] = ahead
+
+    store_idx, sku_idx = np.nonzero(stockout > 0)
+    days_left = stockout[store_idx, sku_idx]
+    stores, products = engine.stores.iloc[store_idx], engine.products.iloc[sku_idx]
+    stockout_date = pd.Timestamp(day) + pd.to_timedelta(days_left, unit='D')
+    result = pd.DataFrame({
+        'store_id': stores['store_id'].to_numpy(),
+        'sku': products['sku'].to_numpy(),
+        'store_name': stores['store_name'].to_numpy(),
+        'product_name': products['product_name'].to_numpy(),
+        'department': products['department'].to_numpy(),
+        'quantity_on_hand': on_hand[store_idx, sku_idx],
+        'daily_forecast': forecast.daily_demand(day + np.timedelta64(1, 'D'))[store_idx, sku_idx],
+        'days_until_stockout': days_left,
+        'projected_stockout': stockout_date,
+        'order_by': stockout_date - pd.to_timedelta(engine.lead_time[sku_idx], unit='D')
+    })
+    return result.sort_values(['days_until_stockout', 'store_id', 'sku'], ignore_index=True)
+
+
+def at_risk(stockouts, index, filters):
+    """Rows of ``projected_stockouts`` matching ``filters``, resolved through a ``FilterIndex``."""
+    return index.select(stockouts, filters).reset_index(drop=True)
+
+
+@lru_cache(maxsize=2)
+def dataset_stockouts(data):
+    """Projected stockouts of an in-memory dataset as of its last day, computed once per object."""
+    forecast = cached_forecast(FrameHistory(data), data.products, data.data_dir)
+    snapshot = data.inventory_index.slice(data.inventory, data.days[-1], data.days[-1])
+    return projected_stockouts(forecast, reorder_engine(data), snapshot)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fit demand forecasts for every store x SKU and cache them.")
+    parser.add_argument('--data-dir', default='.', help="directory holding the generated tables (default: .)")
+    parser.add_argument('--output', help=f"forecast cache file (default: {DEFAULT_CACHE_NAME} in --data-dir)")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help=f"smoothing factor (default: {ALPHA})")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes (default: 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = load_dataset(args.data_dir, columns={'inventory': ['date', 'store_id', 'sku', 'quantity_on_hand',
+                                                              'quantity_sold']})
+    output = Path(args.output or Path(args.data_dir) / DEFAULT_CACHE_NAME)
+
+    started = time.perf_counter()
+    forecast = fit_forecast(FrameHistory(data), data.products, args.alpha, args.workers)
+    seconds = time.perf_counter() - started
+    forecast.save(output)
+
+    snapshot = data.inventory_index.slice(data.inventory, data.days[-1], data.days[-1])
+    stockouts = projected_stockouts(forecast, reorder_engine(data), snapshot)
+    print(f"Fitted {forecast.level.size:,} store/SKU pairs over {len(data.days)} days in {seconds:.2f}s "
+          f"-> {output}")
+    print(f"{len(stockouts):,} pairs projected to stock out within {HORIZON} days of {forecast.as_of}")
+
+
+if __name__ == '__main__':
+    main()
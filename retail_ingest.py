@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental ingestion of newly landed inventory and sales rows.
+
+``IncrementalLoader`` keeps the loaded ``RetailDataset`` and its ``Rollups``
+and, on ``refresh()``, compares the size and mtime of every table file with
+what it has already read:
+
+- rows appended to a fact-table CSV are read from the last byte offset,
+  once the bytes just before it are found unchanged;
+- new Parquet partition files are read on their own;
+- a changed purchase-order table is re-read (it is small);
+- anything else (dimension changes, rewritten or truncated files) triggers a
+  full reload.
+
+A full load reads the fact tables only as far as they reached when it
+started (the complete CSV lines, or the partition files then present), so
+rows a writer lands meanwhile are picked up by the next refresh instead of
+restarting the load.
+
+Appended rows are typed with the dataset's categories, denormalized, and
+spliced into the date-sorted fact tables from their first date onwards, and
+only the rollup days they touch are rebuilt. Each change bumps ``version`` so
+caches keyed on it never serve results computed from older data.
+
+With a ``SharedTables`` store, states are published as memory-mapped
+snapshots keyed by the file signatures they were read from, and a loader
+whose files match an existing snapshot maps it instead of reading anything,
+so replicas share one copy of the tables. A snapshot rewrites every table,
+so only full loads are published on the spot: appended states are published
+in the background, at most once per ``share_interval`` seconds, and until
+then each replica applies the appends to its own copy.
+"""
+
+import io
+import math
+import threading
+import time
+from dataclasses import replace
+
+import pandas as pd
+
+from retail_data import (FACT_DIMENSIONS, FACT_ORDER, ID_COLUMNS, SCHEMAS, TABLES, DateIndex, apply_schema,
+                         build_fact_table, detect_format, load_dataset, parse_dates, read_table,
+                         schema_categories, table_path)
+from retail_rollups import build_rollups, update_rollups
+from retail_shared import fingerprint
+
+
+# Bytes before the read offset of a fact-table CSV compared on refresh: a
+# file rewritten to at least the same size is caught by its content
+ANCHOR_BYTES = 256
+
+# Block size used to find the complete lines of a CSV
+SCAN_BYTES = 1 << 24
+
+# Minimum seconds between background snapshots of appended states
+SHARE_INTERVAL = 60
+
+
+class FullReload(Exception):
+    """The change on disk cannot be applied incrementally."""
+
+
+class IncrementalLoader:
+    """A dataset and its rollups that ``refresh()`` keeps in step with the files in ``data_dir``.
+
+    Readers should take ``snapshot()`` once per use: it returns a consistent
+    ``(version, dataset, rollups)`` triple, and the objects it returns are
+    replaced, never mutated, by later refreshes.
+    """
+
+    def __init__(self, data_dir='.', columns=None, fmt=None, shared=None, share_interval=SHARE_INTERVAL):
+        self.data_dir = data_dir
+        self.columns = columns or {}
+        self.requested_fmt = fmt
+        self.shared = shared
+        self.share_interval = share_interval
+        self.version = 0
+        self.last_change = None
+        self._lock = threading.Lock()
+        # Appended state waiting to be shared, and the background publication
+        self._pending, self._sharing, self._shared_at = None, None, -math.inf
+        self._load()
+
+    # ========== STATE ==========
+    def snapshot(self):
+        return self._state
+
+    @property
+    def dataset(self):
+        return self._state[1]
+
+    @property
+    def rollups(self):
+        return self._state[2]
+
+    def _publish(self, dataset, rollups, change):
+        self.version += 1
+        self.last_change = change
+        self._state = (self.version, dataset, rollups)
+        self._pending = None
+
+    def _signatures(self):
+        """``{(table, file name): (size, mtime_ns)}`` for every file backing a table."""
+        signatures = {}
+        for table in TABLES:
+            path = table_path(self.data_dir, table, self.fmt)
+            files = sorted(path.glob('part-*.parquet')) if path.is_dir() else [path] if path.exists() else []
+            for file in files:
+                stat = file.stat()
+                signatures[(table, file.name)] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    # ========== SHARED SNAPSHOTS ==========
+    def _restore(self, signatures):
+        """Mapped ``(dataset, rollups)`` another loader published for these files, if any."""
+        if self.shared is None:
+            return None
+        state = self.shared.open(fingerprint(self.data_dir, self.fmt, self.columns, signatures))
+        return None if state is None else self._located(*state)
+
+    def _located(self, dataset, rollups):
+        return replace(dataset, data_dir=str(self.data_dir)), rollups
+
+    def _share(self, signatures, dataset, rollups):
+        """Publish a state read from files with these signatures and swap in its mapped copy.
+
+        When the snapshot can't be written the private copy is kept.
+        """
+        if self.shared is None:
+            return dataset, rollups
+        mapped = self.shared.publish(fingerprint(self.data_dir, self.fmt, self.columns, signatures), dataset, rollups)
+        return self._located(*mapped) if mapped else (dataset, rollups)
+
+    def _share_later(self):
+        """Start publishing the pending appended state in the background, if the interval allows."""
+        if (self._pending is None or (self._sharing is not None and self._sharing.is_alive())
+                or time.monotonic() - self._shared_at < self.share_interval):
+            return
+        pending, self._pending = self._pending, None
+        self._shared_at = time.monotonic()
+        self._sharing = threading.Thread(target=self._share_pending, args=pending, daemon=True)
+        self._sharing.start()
+
+    def _share_pending(self, version, signatures, dataset, rollups):
+        """Publish an appended state and swap its mapped copy in, unless a newer version replaced it."""
+        state = self._share(signatures, dataset, rollups)
+        with self._lock:
+            if self.version == version and state[0] is not dataset:
+                self._state = (version, *state)
+
+    # ========== FULL LOAD ==========
+    def _load(self):
+        """Map a shared snapshot of the files or read them as they were when the load started.
+
+        Fact tables are read up to the signatures taken first, so appends
+        during the load don't invalidate it; only a change to another table
+        meanwhile makes it start over.
+        """
+        self.fmt = self.requested_fmt or detect_format(self.data_dir)
+        while True:
+            seen = self._signatures()
+            # Byte offset read up to, the bytes just before it and header of each fact-table CSV
+            limits, self._offsets, self._anchors, self._headers = {}, {}, {}, {}
+            for table in FACT_DIMENSIONS:
+                if self.fmt == 'csv':
+                    path = table_path(self.data_dir, table, 'csv')
+                    limits[table], self._offsets[table] = self._complete_rows(table, seen[(table, path.name)][0])
+                    self._anchors[table] = self._anchor(table, self._offsets[table])
+                    self._headers[table] = list(pd.read_csv(path, nrows=0).columns)
+                elif table_path(self.data_dir, table, 'parquet').is_dir():
+                    limits[table] = sorted(name for source, name in seen if source == table)
+
+            state = self._restore(seen)
+            if state is not None:
+                change = 'mapped'
+                break
+            dataset = load_dataset(self.data_dir, self.columns, self.fmt, limits)
+            current = self._signatures()
+            if all(current.get(key) == seen.get(key) for key in current.keys() | seen.keys()
+                   if key[0] not in FACT_DIMENSIONS):
+                state, change = (dataset, build_rollups(dataset)), 'loaded'
+                if self._whole(seen, self._offsets):
+                    state = self._share(seen, *state)
+                break
+
+        self._seen = seen
+        self._publish(*state, change)
+
+    def _complete_rows(self, table, size):
+        """Data rows in the complete lines of the first ``size`` bytes of a fact-table CSV, and where they end."""
+        lines, end, read = 0, 0, 0
+        with open(table_path(self.data_dir, table, 'csv'), 'rb') as f:
+            while read < size:
+                block = f.read(min(SCAN_BYTES, size - read))
+                if not block:
+                    break
+                lines += block.count(b'\n')
+                if block.rfind(b'\n') >= 0:
+                    end = read + block.rfind(b'\n') + 1
+                read += len(block)
+        return max(lines - 1, 0), end
+
+    def _whole(self, signatures, offsets):
+        """Whether the fact-table CSVs were read to the end (a snapshot stands for whole files)."""
+        return all(offset == signatures[(table, table_path(self.data_dir, table, 'csv').name)][0]
+                   for table, offset in offsets.items())
+
+    # ========== INCREMENTAL REFRESH ==========
+    def refresh(self):
+        """Pick up new data on disk; returns True if a new version was published."""
+        with self._lock:
+            current = self._signatures()
+            changed = current != self._seen
+            if changed:
+                try:
+                    self._apply(current)
+                except FullReload:
+                    self._load()
+            self._share_later()
+            return changed
+
+    def _apply(self, current):
+        state = self._restore(current)
+        if state is not None:
+            self._seen = current
+            self._offsets = {table: current[(table, table_path(self.data_dir, table, 'csv').name)][0]
+                             for table in self._offsets}
+            self._anchors = {table: self._anchor(table, offset) for table, offset in self._offsets.items()}
+            self._publish(*state, 'mapped')
+            return
+
+        changed = {key for key in current.keys() | self._seen.keys() if current.get(key) != self._seen.get(key)}
+        deltas = {table: [] for table in FACT_DIMENSIONS}
+        offsets, anchors = dict(self._offsets), dict(self._anchors)
+        reread_orders = False
+
+        # Decide on every change before reading anything, so a regenerated
+        # dataset is never read as an append to the old one
+        appended = []
+        for table, name in sorted(changed):
+            before, after = self._seen.get((table, name)), current.get((table, name))
+            if table == 'purchase_orders' and after is not None:
+                reread_orders = True
+            elif table not in FACT_DIMENSIONS or after is None:
+                raise FullReload(f"{table}/{name} changed")
+            elif self.fmt == 'csv':
+                if (before is None or after[0] < offsets[table]
+                        or self._anchor(table, offsets[table]) != anchors[table]):
+                    raise FullReload(f"{name} was rewritten")
+                appended.append((table, after))
+            elif before is None:
+                appended.append((table, name))
+            else:
+                raise FullReload(f"partition {name} was rewritten")
+
+        for table, change in appended:
+            if self.fmt == 'csv':
+                delta, offsets[table] = self._read_csv_delta(table, offsets[table], change[0])
+                anchors[table] = self._anchor(table, offsets[table])
+            else:
+                delta = pd.read_parquet(table_path(self.data_dir, table, 'parquet') / change,
+                                        columns=self.columns.get(table))
+            deltas[table].append(delta)
+
+        _, dataset, rollups = self._state
+        categories = schema_categories(dataset.tables)
+        updates, starts, rows = {}, {}, 0
+        for table, frames in deltas.items():
+            frames = [df for df in frames if len(df)]
+            if frames:
+                delta = pd.concat(frames, ignore_index=True)
+                starts[table], updates[table], updates[f'{table}_index'] = self._append(
+                    dataset, table, delta, categories)
+                rows += len(delta)
+        if reread_orders:
+            updates['purchase_orders'] = self._typed(
+                read_table(self.data_dir, 'purchase_orders', self.columns.get('purchase_orders'), self.fmt),
+                'purchase_orders', categories)
+
+        self._seen, self._offsets, self._anchors = current, offsets, anchors
+        if updates:
+            dataset = replace(dataset, **updates)
+            rollups = update_rollups(rollups, dataset, starts)
+            self._publish(dataset, rollups, f'appended {rows:,} rows' if rows else 'purchase orders updated')
+            # A snapshot stands for whole files, so a CSV ending in a partial line isn't shared yet
+            if self.shared is not None and self._whole(current, offsets):
+                self._pending = (self.version, current, dataset, rollups)
+
+    def _anchor(self, table, offset):
+        """The ``ANCHOR_BYTES`` of a fact-table CSV ending at ``offset``."""
+        with open(table_path(self.data_dir, table, 'csv'), 'rb') as f:
+            f.seek(max(0, offset - ANCHOR_BYTES))
+            return f.read(min(offset, ANCHOR_BYTES))
+
+    def _read_csv_delta(self, table, offset, size):
+        """Rows between ``offset`` and the last complete line before ``size``, plus the new offset."""
+        with open(table_path(self.data_dir, table, 'csv'), 'rb') as f:
+            f.seek(offset)
+            raw = f.read(size - offset)
+        end = raw.rfind(b'\n') + 1
+        if end == 0:
+            return pd.DataFrame(columns=self._headers[table]), offset
+
+        try:
+            df = pd.read_csv(io.BytesIO(raw[:end]), header=None, names=self._headers[table],
+                             usecols=self.columns.get(table))
+            return parse_dates(df, table), offset + end
+        except (ValueError, pd.errors.ParserError) as e:
+            raise FullReload(f"unreadable rows appended to {table}: {e}") from e
+
+    def _typed(self, df, table, categories):
+        """Apply the dataset's schema to new rows of ``table``; unknown ids need a full reload."""
+        try:
+            apply_schema({table: df}, categories)
+        except (ValueError, TypeError) as e:
+            raise FullReload(f"rows of {table} don't fit its schema: {e}") from e
+        for col, dtype in SCHEMAS[table].items():
+            if dtype.startswith('ids:') and col in df.columns and df[col].isna().any():
+                raise FullReload(f"new {ID_COLUMNS[dtype[4:]]} values in {table}")
+        return df
+
+    def _append(self, dataset, table, delta, categories):
+        """Splice ``delta`` rows into a fact table from their first date onwards.
+
+        Existing rows on or after that date are re-sorted together with the
+        new ones, so late or intraday rows keep the (date, store, sku) order.
+        """
+        delta = build_fact_table(self._typed(delta, table, categories), dataset.tables, table)
+        fact, index = getattr(dataset, table), getattr(dataset, f'{table}_index')
+
+        start = delta['date'].iloc[0]
+        position = index.position(start)
+        row = index.offsets[position]
+        tail = pd.concat([fact.iloc[row:], delta], ignore_index=True)
+        if row < len(fact):
+            tail = tail.sort_values(FACT_ORDER, kind='stable', ignore_index=True)
+
+        merged = pd.concat([fact.iloc[:row], tail], ignore_index=True)
+        return start, merged, index.splice(position, DateIndex(tail['date']))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing and memory instrumentation for dashboard reruns.
+
+A ``Profiler`` records wall time and the net memory allocated (traced with
+``tracemalloc``) for named sections of a script. Sections nest, and
+``lap(name)`` ends the running top-level section and starts the next one, so
+a linear Streamlit script can be instrumented without re-indenting it:
+
+    profiler = Profiler(enabled=True)
+    profiler.lap('kpis')
+    ...
+    with profiler.section('compute'):
+        ...
+    profiler.lap('heatmap')
+    ...
+    profiler.close()
+    profiler.report()
+
+Tracing allocations slows Python code down noticeably, so disabled profilers
+do nothing. ``tracemalloc`` is process-wide, so it is started by the first
+enabled profiler and stopped when the last one still running is closed (or
+garbage collected, for runs that were interrupted).
+"""
+
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Whether tracemalloc was started by a profiler (as opposed to e.g. -X tracemalloc)
+_tracing_owner = False
+
+# Enabled profilers not yet closed, across all sessions of the process
+_tracing_runs = 0
+_tracing_lock = threading.Lock()
+
+
+def _acquire_tracing():
+    global _tracing_owner, _tracing_runs
+    with _tracing_lock:
+        _tracing_runs += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owner = True
+        # The peak is process-wide: only reset it when no other run is measuring it
+        if _tracing_runs == 1:
+            tracemalloc.reset_peak()
+
+
+def _release_tracing():
+    global _tracing_owner, _tracing_runs
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if _tracing_runs == 0 and _tracing_owner:
+            tracemalloc.stop()
+            _tracing_owner = False
+
+
+class Profiler:
+    """Collects ``{section, start_ms, ms, alloc_mb, depth}`` records for one run."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._stack = []
+        self._lap = None
+        self._started = time.perf_counter()
+        self._peak = None
+        if enabled:
+            _acquire_tracing()
+            self._release = weakref.finalize(self, _release_tracing)
+
+    @contextmanager
+    def section(self, name):
+        """Time the enclosed block as ``name``, nested under any running section."""
+        if not self.enabled:
+            yield
+            return
+
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        depth = len(self._stack) - 1
+        allocated = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._stack.pop()
+            self.records.append({
+                'section': path,
+                'depth': depth,
+                'start_ms': (started - self._started) * 1000,
+                'ms': seconds * 1000,
+                'alloc_mb': (tracemalloc.get_traced_memory()[0] - allocated) / 1024 ** 2
+            })
+
+    def lap(self, name):
+        """End the current top-level section (if any) and start one called ``name``."""
+        self.stop()
+        self._lap = self.section(name)
+        self._lap.__enter__()
+
+    def stop(self):
+        """End the current top-level section."""
+        if self._lap is not None:
+            lap, self._lap = self._lap, None
+            lap.__exit__(None, None, None)
+
+    def close(self):
+        """End the run: stop the current section and release tracing (idempotent)."""
+        self.stop()
+        if self.enabled and self._release.alive:
+            self._peak = tracemalloc.get_traced_memory()[1]
+            self._release()
+
+    @property
+    def peak_mb(self):
+        """Peak traced memory while the profiler ran.
+
+        The peak is process-wide, so with overlapping profiled runs it covers
+        them all since the earliest one started (an upper bound for this run).
+        """
+        if not self.enabled:
+            return float('nan')
+        peak = self._peak if self._peak is not None else tracemalloc.get_traced_memory()[1]
+        return peak / 1024 ** 2
+
+    def report(self):
+        """Records in start order, with each top-level section's share of the total time."""
+        report = pd.DataFrame(self.records, columns=['section', 'depth', 'start_ms', 'ms', 'alloc_mb'])
+        report = report.sort_values(['start_ms', 'depth'], ignore_index=True)
+        top = report['depth'] == 0
+        report['share_pct'] = (report['ms'] / report.loc[top, 'ms'].sum() * 100).where(top).round(1)
+        return report
+
+    def to_json(self, **metadata):
+        """Serialize the trace, plus any ``metadata``, for offline analysis."""
+        trace = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'total_ms': sum(r['ms'] for r in self.records if r['depth'] == 0),
+            'peak_mb': self.peak_mb,
+            **metadata,
+            'sections': sorted(self.records, key=lambda r: (r['start_ms'], r['depth']))
+        }
+        return json.dumps(trace, indent=2, default=str)
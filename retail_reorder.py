@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized reorder evaluation over the full store x SKU matrix.
+
+``ReorderEngine`` holds dense ``(stores, skus)`` arrays, indexed by the
+shared category codes of ``store_id`` and ``sku``, and evaluates every pair
+for a day in a handful of NumPy operations:
+
+- on hand: that day's ``quantity_on_hand``;
+- on order: open purchase orders, i.e. ordered on or before the day and not
+  yet delivered (or still marked In Transit);
+- daily demand: mean ``quantity_sold`` over the trailing ``DEMAND_WINDOW`` days;
+- inventory position = on hand + on order, and the projected position once
+  the SKU's lead time has passed.
+
+A pair needs reordering when its inventory position is at or below the
+reorder point. Its urgency is how far below, and its priority is raised one
+level when the stock on hand will run out before a new order could arrive.
+
+    python retail_reorder.py --start 2024-11-01 --end 2024-11-27
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from retail_data import load_dataset
+
+# Trailing days averaged into the daily demand rate
+DEMAND_WINDOW = 28
+
+PRIORITIES = ['Medium', 'High', 'Critical']
+
+# Urgency (% below reorder point) at which priority becomes High, then Critical
+URGENCY_BINS = [50, 80]
+
+
+@dataclass
+class ReorderState:
+    """Dense ``(stores, skus)`` reorder inputs and results for one day."""
+    day: np.datetime64
+    stocked: np.ndarray
+    on_hand: np.ndarray
+    on_order: np.ndarray
+    demand: np.ndarray
+    position: np.ndarray
+    projected: np.ndarray
+    urgency: np.ndarray
+    priority: np.ndarray
+    needs_reorder: np.ndarray
+
+
+class ReorderEngine:
+    """Per-SKU policy vectors and open purchase orders laid out on the store x SKU grid."""
+
+    def __init__(self, stores, products, purchase_orders):
+        self.stores = stores
+        self.products = products
+        self.shape = (len(stores), len(products))
+
+        # Per-SKU policy, broadcast across stores
+        self.reorder_point = products['reorder_point'].to_numpy('float64')
+        self.lead_time = products['lead_time_days'].to_numpy('float64')
+
+        self._po_pairs = self.pair_codes(purchase_orders['store_id'], purchase_orders['sku'])
+        self._po_quantity = purchase_orders['order_quantity'].to_numpy('float64')
+        self._po_ordered = purchase_orders['order_date'].to_numpy('datetime64[D]')
+        self._po_due = purchase_orders['expected_delivery'].to_numpy('datetime64[D]')
+        self._po_in_transit = (purchase_orders['status'] == 'In Transit').to_numpy()
+
+    def pair_codes(self, store_ids, skus):
+        """Flat grid position of each (store_id, sku) pair; both are categoricals over the dimension ids."""
+        return store_ids.cat.codes.to_numpy('int64') * self.shape[1] + skus.cat.codes.to_numpy('int64')
+
+    def matrix(self, pairs, values):
+        """Sum ``values`` into a dense grid by flat pair position."""
+        size = self.shape[0] * self.shape[1]
+        return np.bincount(pairs, weights=values, minlength=size).reshape(self.shape)
+
+    def on_order(self, day):
+        """Units on open purchase orders as of ``day``."""
+        day = np.datetime64(day, 'D')
+        is_open = (self._po_ordered <= day) & ((self._po_due > day) | self._po_in_transit)
+        return self.matrix(self._po_pairs[is_open], self._po_quantity[is_open])
+
+    def scheduled_receipts(self, day, horizon):
+        """``(days ahead, pair, quantity)`` of open orders due within ``horizon`` days of ``day``.
+
+        Orders still In Transit past their expected delivery are counted as
+        arriving the next day.
+        """
+        day = np.datetime64(day, 'D')
+        is_open = (self._po_ordered <= day) & ((self._po_due > day) | self._po_in_transit)
+        due_in = np.maximum((self._po_due - day).astype('int64'), 1)
+        keep = is_open & (due_in <= horizon)
+        return due_in[keep], self._po_pairs[keep], self._po_quantity[keep]
+
+    def evaluate(self, day, snapshot, demand):
+        """Reorder state for ``day`` from its inventory rows and a dense daily-demand grid.
+
+        ``snapshot`` holds that day's ``store_id``, ``sku`` and
+        ``quantity_on_hand``; pairs without a row are not stocked and never
+        flagged.
+        """
+        pairs = self.pair_codes(snapshot['store_id'], snapshot['sku'])
+        on_hand = self.matrix(pairs, snapshot['quantity_on_hand'].to_numpy('float64'))
+        stocked = np.zeros(self.shape, dtype=bool)
+        stocked.flat[pairs] = True
+
+        on_order = self.on_order(day)
+        position = on_hand + on_order
+        projected = position - demand * self.lead_time
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            urgency = np.where(self.reorder_point > 0,
+                               (self.reorder_point - position) / self.reorder_point * 100, 0.0)
+        priority = np.searchsorted(URGENCY_BINS, urgency, side='left')
+        # Escalate one level when stock on hand runs out before an order
+        # placed today could arrive
+        priority = np.minimum(priority + (on_hand <= demand * self.lead_time), len(PRIORITIES) - 1)
+
+        return ReorderState(
+            day=np.datetime64(day, 'D'), stocked=stocked, on_hand=on_hand, on_order=on_order, demand=demand,
+            position=position, projected=projected, urgency=urgency, priority=priority,
+            needs_reorder=stocked & (position <= self.reorder_point)
+        )
+
+    def alerts(self, state, stores=None, products=None):
+        """Flagged pairs of ``state`` as rows, optionally restricted to bitmaps of store and SKU codes."""
+        mask = state.needs_reorder.copy()
+        if stores is not None:
+            mask &= stores[:, None]
+        if products is not None:
+            mask &= products[None, :]
+
+        store_idx, sku_idx = np.nonzero(mask)
+        stores = self.stores.iloc[store_idx]
+        products = self.products.iloc[sku_idx]
+        with np.errstate(divide='ignore'):
+            days_of_cover = state.on_hand[mask] / state.demand[mask]
+        return pd.DataFrame({
+            'date': pd.Timestamp(state.day),
+            'store_id': stores['store_id'].to_numpy(),
+            'sku': products['sku'].to_numpy(),
+            'store_name': stores['store_name'].to_numpy(),
+            'product_name': products['product_name'].to_numpy(),
+            'department': products['department'].to_numpy(),
+            'category': products['category'].to_numpy(),
+            'quantity_on_hand': state.on_hand[mask],
+            'on_order': state.on_order[mask],
+            'reorder_point': self.reorder_point[sku_idx],
+            'daily_demand': state.demand[mask],
+            'days_of_cover': days_of_cover,
+            'lead_time_days': self.lead_time[sku_idx],
+            'projected_position': state.projected[mask],
+            'urgency_score': state.urgency[mask],
+            'priority': pd.Categorical.from_codes(state.priority[mask], PRIORITIES, ordered=True)
+        })
+
+
+def latest_day(days, start=None, end=None):
+    """Last of ``days`` inside ``start``..``end`` (``end`` itself if none is)."""
+    if start is None:
+        return days[-1]
+    inside = days[(days >= np.datetime64(start, 'D')) & (days <= np.datetime64(end, 'D'))]
+    return inside[-1] if len(inside) else np.datetime64(end, 'D')
+
+
+@lru_cache(maxsize=2)
+def reorder_engine(data):
+    """The engine for a loaded dataset (or database), built once per object."""
+    return ReorderEngine(data.stores, data.products, data.purchase_orders)
+
+
+def trailing_demand(engine, inventory, index, day, window=DEMAND_WINDOW):
+    """Dense mean daily ``quantity_sold`` over the ``window`` days ending on ``day``."""
+    day = np.datetime64(day, 'D')
+    first = day - np.timedelta64(window - 1, 'D')
+    rows = index.slice(inventory, first, day)
+    days = max(1, index.position(day + np.timedelta64(1, 'D')) - index.position(first))
+    sold = engine.matrix(engine.pair_codes(rows['store_id'], rows['sku']), rows['quantity_sold'].to_numpy('float64'))
+    return sold / days
+
+
+def evaluate_day(data, day, window=DEMAND_WINDOW):
+    """Reorder state of every store x SKU of an in-memory dataset on ``day``."""
+    engine = reorder_engine(data)
+    snapshot = data.inventory_index.slice(data.inventory, day, day)
+    return engine.evaluate(day, snapshot, trailing_demand(engine, data.inventory, data.inventory_index, day, window))
+
+
+def iter_states(data, start, end, window=DEMAND_WINDOW):
+    """Yield the reorder state of every day from ``start`` to ``end``.
+
+    The trailing demand window slides one day at a time, adding the new day's
+    sales and dropping the oldest, so the whole range costs one pass over its
+    rows.
+    """
+    engine = reorder_engine(data)
+    inventory, index = data.inventory, data.inventory_index
+    days = index.days[(index.days >= np.datetime64(start, 'D')) & (index.days <= np.datetime64(end, 'D'))]
+    if not len(days):
+        return
+
+    def sold_on(day):
+        rows = index.slice(inventory, day, day)
+        return engine.matrix(engine.pair_codes(rows['store_id'], rows['sku']), rows['quantity_sold'].to_numpy('float64'))
+
+    window_days = [d for d in index.days if days[0] - np.timedelta64(window, 'D') < d < days[0]]
+    sold = sum((sold_on(d) for d in window_days), np.zeros(engine.shape))
+    for day in days:
+        sold += sold_on(day)
+        window_days.append(day)
+        while window_days[0] <= day - np.timedelta64(window, 'D'):
+            sold -= sold_on(window_days.pop(0))
+        yield engine.evaluate(day, index.slice(inventory, day, day), sold / len(window_days))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate reorder needs for every store x SKU and day.")
+    parser.add_argument('--data-dir', default='.', help="directory holding the generated tables (default: .)")
+    parser.add_argument('--start', type=date.fromisoformat, help="first date (default: last date)")
+    parser.add_argument('--end', type=date.fromisoformat, help="last date (default: last date)")
+    parser.add_argument('--window', type=int, default=DEMAND_WINDOW,
+                        help=f"trailing days of demand (default: {DEMAND_WINDOW})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = load_dataset(args.data_dir)
+    start = args.start or data.days[-1].item()
+    end = args.end or data.days[-1].item()
+
+    started = time.perf_counter()
+    counts = []
+    for state in iter_states(data, start, end, args.window):
+        flagged = state.priority[state.needs_reorder]
+        counts.append({'date': pd.Timestamp(state.day).date(),
+                       **{p: int((flagged == i).sum()) for i, p in enumerate(PRIORITIES)}})
+    seconds = time.perf_counter() - started
+
+    engine = reorder_engine(data)
+    print(pd.DataFrame(counts).to_string(index=False))
+    print(f"Evaluated {len(counts)} days x {engine.shape[0] * engine.shape[1]:,} store/SKU pairs "
+          f"in {seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
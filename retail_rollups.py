@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-aggregated daily rollups of the fact tables.
+
+Each rollup holds one row per (date, store, department, category) with the
+additive measures the dashboard panels need, so KPIs, trends, turnover, stockouts and
+the heatmap aggregate a few thousand cube rows instead of the raw history.
+Running totals of the inventory rollup over the days (``RangeSums``) turn
+range averages such as the average inventory of a period into two lookups.
+"""
+
+from dataclasses import dataclass, replace
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from retail_data import DateIndex, denormalize
+
+# Categories are kept apart (they nest in departments) so category filters
+# can be answered from the rollups too
+ROLLUP_KEYS = ['date', 'store_id', 'department', 'category']
+
+# Store attributes re-attached to the rollups after grouping
+ROLLUP_STORE_COLUMNS = ['store_name', 'region']
+
+
+class Rollup:
+    """Daily totals of a fact table by store x department x category, sorted by date."""
+
+    def __init__(self, frame, index=None):
+        self.frame = frame
+        self.index = index if index is not None else DateIndex(frame['date'])
+
+    def select(self, start=None, end=None):
+        """Return the cube rows inside a date range (all rows when ``start`` is None)."""
+        return self.frame if start is None else self.index.slice(self.frame, start, end)
+
+    def splice(self, start, tail):
+        """Replace the cube rows from ``start`` onwards with those of the ``tail`` rollup."""
+        position = self.index.position(start)
+        frame = pd.concat([self.frame.iloc[:self.index.offsets[position]], tail.frame], ignore_index=True)
+        return Rollup(frame, self.index.splice(position, tail.index))
+
+
+def _rollup(fact, stores, **measures):
+    frame = fact.groupby(ROLLUP_KEYS, observed=True, sort=True).agg(**measures).reset_index()
+    return Rollup(denormalize(frame, stores, 'store_id', ROLLUP_STORE_COLUMNS))
+
+
+def build_sales_rollup(sales, stores):
+    """Revenue, profit, cost, units and line counts per day x store x category."""
+    return _rollup(
+        sales.assign(margin_sum=sales['profit_margin'].astype('float64')),
+        stores,
+        revenue=('revenue', 'sum'),
+        profit=('profit', 'sum'),
+        cost=('cost', 'sum'),
+        quantity=('quantity', 'sum'),
+        transactions=('transaction_id', 'count'),
+        margin_sum=('margin_sum', 'sum')
+    )
+
+
+def build_inventory_rollup(inventory, stores):
+    """On-hand value/units, item counts and stock-status counts per day x store x category."""
+    return _rollup(
+        inventory.assign(
+            stockouts=inventory['status'] == 'Out of Stock',
+            low_stock=inventory['status'] == 'Low Stock'
+        ),
+        stores,
+        value_on_hand=('value_on_hand', 'sum'),
+        quantity_on_hand=('quantity_on_hand', 'sum'),
+        items=('sku', 'count'),
+        stockouts=('stockouts', 'sum'),
+        low_stock=('low_stock', 'sum')
+    )
+
+
+class RangeSums:
+    """Running totals of rollup measures per store x department x category over the days.
+
+    ``totals[name][g, i]`` is the total of ``name`` for group ``g`` over the
+    first ``i`` days, so the sum over any date range is the difference of two
+    columns, however long the range.
+    """
+
+    def __init__(self, rollup, measures):
+        frame, self.days = rollup.frame, rollup.index.days
+        grouped = frame.groupby(ROLLUP_KEYS[1:], observed=True, sort=True)
+        self.groups = grouped.size().index.to_frame(index=False)
+
+        n_days = len(self.days)
+        day = np.repeat(np.arange(n_days), np.diff(rollup.index.offsets))
+        cells = grouped.ngroup().to_numpy() * n_days + day
+        self.totals = {}
+        for name in measures:
+            daily = np.bincount(cells, weights=frame[name].to_numpy('float64'), minlength=len(self.groups) * n_days)
+            running = np.zeros((len(self.groups), n_days + 1))
+            np.cumsum(daily.reshape(len(self.groups), n_days), axis=1, out=running[:, 1:])
+            self.totals[name] = running
+
+    def mean(self, start=None, end=None):
+        """Daily average of each measure over the days ``start``..``end``, one row per group."""
+        lo, hi = 0, len(self.days)
+        if start is not None:
+            lo = np.searchsorted(self.days, np.datetime64(start, 'D'), side='left')
+            hi = max(lo, np.searchsorted(self.days, np.datetime64(end, 'D'), side='right'))
+        with np.errstate(invalid='ignore'):
+            return self.groups.assign(**{
+                name: (totals[:, hi] - totals[:, lo]) / (hi - lo) for name, totals in self.totals.items()})
+
+
+@dataclass
+class Rollups:
+    sales: Rollup
+    inventory: Rollup
+
+    @cached_property
+    def inventory_sums(self):
+        """Running on-hand value and units per rollup group, built on first use."""
+        return RangeSums(self.inventory, ['value_on_hand', 'quantity_on_hand'])
+
+
+def build_rollups(dataset):
+    """Materialize both rollups for a ``RetailDataset``."""
+    return Rollups(
+        sales=build_sales_rollup(dataset.sales, dataset.stores),
+        inventory=build_inventory_rollup(dataset.inventory, dataset.stores)
+    )
+
+
+# Fact table -> rollup builder
+ROLLUP_BUILDERS = {'sales': build_sales_rollup, 'inventory': build_inventory_rollup}
+
+
+def update_rollups(rollups, dataset, starts):
+    """Rebuild only the days on or after ``starts[table]`` once rows were appended to ``dataset``."""
+    updated = {}
+    for table, start in starts.items():
+        fact, index = getattr(dataset, table), getattr(dataset, f'{table}_index')
+        tail = fact.iloc[index.offsets[index.position(start)]:]
+        updated[table] = getattr(rollups, table).splice(start, ROLLUP_BUILDERS[table](tail, dataset.stores))
+    return replace(rollups, **updated)
+
+
+def latest_snapshot(inventory_rollup_rows):
+    """Restrict inventory rollup rows to their most recent date."""
+    if inventory_rollup_rows.empty:
+        return inventory_rollup_rows
+    latest = inventory_rollup_rows['date'].iloc[-1]
+    return inventory_rollup_rows[inventory_rollup_rows['date'] == latest]
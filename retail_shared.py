@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Loaded tables shared between dashboard processes through memory-mapped files.
+
+Every replica of the dashboard would otherwise parse the source files and
+hold its own copy of the typed, denormalized fact tables. Instead, the first
+process to load a given version of the data writes the tables and rollups as
+uncompressed Arrow IPC files into a snapshot directory named after a
+fingerprint of the source files; every process (including the writer) then
+memory-maps them. The page cache holds one copy however many replicas
+there are, and a cold start is a few ``mmap`` calls instead of a CSV parse.
+
+Columns are mapped without copying: numbers, dates and strings through
+Arrow's pandas conversion, and categoricals by wrapping the dictionary
+indices as codes. The frames are backed by read-only buffers, which the
+dataset already requires of its readers.
+"""
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from retail_data import TABLES, RetailDataset
+from retail_rollups import Rollup, Rollups
+
+# Bump when the snapshot layout changes so older snapshots are never opened
+FORMAT_VERSION = 3
+
+# Snapshots kept on disk; older ones are deleted when a new one is published
+# (processes that still map them keep their pages until they let go)
+KEEP_SNAPSHOTS = 2
+
+ROLLUP_TABLES = ('sales', 'inventory')
+
+
+# ========== ARROW FILES ==========
+def write_frame(df, path):
+    """Write ``df`` as one record batch of an Arrow IPC file, so every column maps as one buffer."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    strings = [i for i, field in enumerate(table.schema) if pa.types.is_string(field.type)]
+    for i in strings:
+        table = table.set_column(i, table.field(i).with_type(pa.large_string()),
+                                 table.column(i).cast(pa.large_string()))
+    table = table.combine_chunks()
+    # An empty table has no batches, and categorical dictionaries are only
+    # written with a batch: write one of zero rows so the categories survive
+    batches = table.to_batches() or [pa.RecordBatch.from_arrays([column.combine_chunks() for column in table.columns],
+                                                                schema=table.schema)]
+    with ipc.new_file(str(path), table.schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _column(chunked):
+    """pandas values of an Arrow column, sharing its buffers where the type allows."""
+    if not pa.types.is_dictionary(chunked.type):
+        return chunked.to_pandas()
+    array = chunked.chunk(0) if chunked.num_chunks == 1 else chunked.combine_chunks()
+    indices = array.indices.fill_null(-1) if array.null_count else array.indices
+    dtype = pd.CategoricalDtype(array.dictionary.to_pandas(), ordered=chunked.type.ordered)
+    return pd.Categorical.from_codes(indices.to_numpy(), dtype=dtype, validate=False)
+
+
+def read_frame(path):
+    """Memory-map an Arrow IPC file written by ``write_frame`` as a DataFrame."""
+    table = ipc.open_file(pa.memory_map(str(path))).read_all()
+    return pd.DataFrame({name: _column(table.column(name)) for name in table.column_names}, copy=False)
+
+
+# ========== SNAPSHOTS ==========
+def fingerprint(data_dir, fmt, columns, signatures):
+    """Snapshot name for the tables loaded from files with these ``(size, mtime)`` signatures."""
+    source = repr((FORMAT_VERSION, str(Path(data_dir).resolve()), fmt,
+                   sorted((table, list(cols)) for table, cols in columns.items()), sorted(signatures.items())))
+    return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+
+class SharedTables:
+    """Directory of dataset snapshots, one subdirectory of Arrow files per fingerprint.
+
+    Snapshots are written to a temporary directory and renamed into place, so
+    a snapshot that exists is complete, and concurrent writers of the same
+    fingerprint leave exactly one of them.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def open(self, key):
+        """``(dataset, rollups)`` mapped from snapshot ``key``, or None if it was never published."""
+        path = self.root / key
+        if not path.is_dir():
+            return None
+        dataset = RetailDataset(**{table: read_frame(path / f'{table}.arrow') for table in TABLES})
+        rollups = Rollups(**{name: Rollup(read_frame(path / f'rollup_{name}.arrow')) for name in ROLLUP_TABLES})
+        return dataset, rollups
+
+    def publish(self, key, dataset, rollups):
+        """Write a snapshot of ``dataset`` and ``rollups`` under ``key`` and return it mapped.
+
+        Returns None when the snapshot can't be written (e.g. a read-only data
+        directory); the caller then keeps its private copy.
+        """
+        path = self.root / key
+        if not path.is_dir():
+            staging = self.root / f'.staging-{key}-{os.getpid()}'
+            try:
+                staging.mkdir(parents=True, exist_ok=True)
+                for table, df in dataset.tables.items():
+                    write_frame(df, staging / f'{table}.arrow')
+                for name in ROLLUP_TABLES:
+                    write_frame(getattr(rollups, name).frame, staging / f'rollup_{name}.arrow')
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+                return None
+            try:
+                staging.rename(path)
+            except OSError:
+                # Another process published the same snapshot first (or the
+                # rename failed, in which case the snapshot doesn't exist)
+                shutil.rmtree(staging, ignore_errors=True)
+                if not path.is_dir():
+                    return None
+            self.prune(keep=key)
+        return self.open(key)
+
+    def prune(self, keep):
+        """Delete all but the ``KEEP_SNAPSHOTS`` newest snapshots, never ``keep``."""
+        try:
+            snapshots = sorted((p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.')),
+                               key=lambda p: p.stat().st_mtime_ns, reverse=True)
+        except OSError:
+            return
+        for stale in snapshots[KEEP_SNAPSHOTS:]:
+            if stale.name != keep:
+                shutil.rmtree(stale, ignore_errors=True)
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+Optional embedded-database backend (SQLite, or DuckDB when installed).
+
+The generated tables are copied once into a local database file, with the
+fact tables denormalized exactly as ``load_dataset`` builds them in memory:
+
+    python retail_sql.py --data-dir . --db retail.duckdb --backend duckdb
+
+The dashboard then runs with ``RETAIL_BACKEND=duckdb`` (or ``sqlite``): only
+the small dimension and purchase-order tables and the daily rollups are held
+in memory, and the panels that read raw rows push their date, store and
+product filters and group-bys down as SQL, so only aggregated results come back.
+Queries use ``?`` parameters and ISO-8601 text dates so the same SQL runs on
+both engines.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import replace
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from retail_analytics import DATASET_CACHES, PANELS, classify_abc
+from retail_data import (DATE_COLUMNS, FACT_DIMENSIONS, ID_COLUMNS, apply_schema, denormalize, detect_format,
+                         read_table, read_table_chunks, schema_categories)
+from retail_filters import PRODUCT_FIELDS, filter_index
+from retail_forecast import at_risk, cached_forecast, projected_stockouts
+from retail_reorder import DEMAND_WINDOW, latest_day, reorder_engine
+from retail_rollups import ROLLUP_KEYS, ROLLUP_STORE_COLUMNS, Rollup, Rollups
+from retail_stockouts import RevenueIndex, pair_day_keys, summarize_losses
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKENDS = ('sqlite', 'duckdb')
+
+# Tables held in memory by the SQL backend; inventory and sales stay in the database
+SMALL_TABLES = ('stores', 'products', 'suppliers', 'purchase_orders')
+
+# Fact-table indexes (DuckDB also prunes on its own min/max zone maps)
+FACT_INDEXES = [('date',), ('store_id', 'date'), ('department', 'date')]
+
+# Measures of the daily store x department x category rollups, as in retail_rollups
+ROLLUP_MEASURES = {
+    'sales': {
+        'revenue': 'SUM(revenue)',
+        'profit': 'SUM(profit)',
+        'cost': 'SUM(cost)',
+        'quantity': 'SUM(quantity)',
+        'transactions': 'COUNT(transaction_id)',
+        'margin_sum': 'SUM(profit_margin)'
+    },
+    'inventory': {
+        'value_on_hand': 'SUM(value_on_hand)',
+        'quantity_on_hand': 'SUM(quantity_on_hand)',
+        'items': 'COUNT(sku)',
+        'stockouts': "SUM(CASE WHEN status = 'Out of Stock' THEN 1 ELSE 0 END)",
+        'low_stock': "SUM(CASE WHEN status = 'Low Stock' THEN 1 ELSE 0 END)"
+    }
+}
+
+
+def connect(db_path, backend='sqlite', read_only=False):
+    """Open a connection to a database file with ``backend``."""
+    if backend == 'duckdb':
+        if duckdb is None:
+            raise ImportError("the duckdb backend requires 'pip install duckdb'")
+        return duckdb.connect(str(db_path), read_only=read_only)
+    if read_only:
+        return sqlite3.connect(f'file:{Path(db_path).resolve()}?mode=ro', uri=True, check_same_thread=False)
+    return sqlite3.connect(str(db_path), check_same_thread=False)
+
+
+# ========== BUILD ==========
+def _to_sql_frame(df):
+    """Categoricals as plain strings and datetimes as ISO dates, ready for insertion."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df
+
+
+def _insert(conn, backend, table, df, create):
+    df = _to_sql_frame(df)
+    if backend == 'duckdb':
+        conn.register('chunk', df)
+        conn.execute(f'CREATE TABLE {table} AS SELECT * FROM chunk' if create else f'INSERT INTO {table} SELECT * FROM chunk')
+        conn.unregister('chunk')
+    else:
+        df.to_sql(table, conn, if_exists='replace' if create else 'append', index=False)
+
+
+def build_database(data_dir, db_path, backend='sqlite', fmt=None, chunk_rows=1_000_000):
+    """Copy the generated tables into a new database file, streaming the fact tables in chunks.
+
+    The file is built next to ``db_path`` and moved into place at the end, so
+    a running dashboard never sees a half-written database.
+    """
+    fmt = fmt or detect_format(data_dir)
+    db_path = Path(db_path)
+    building = db_path.with_name(db_path.name + '.building')
+    building.unlink(missing_ok=True)
+    conn = connect(building, backend)
+
+    dims = apply_schema({table: read_table(data_dir, table, fmt=fmt) for table in ('stores', 'products', 'suppliers')})
+    categories = schema_categories(dims)
+    for table, df in dims.items():
+        _insert(conn, backend, table, df, create=True)
+    _insert(conn, backend, 'purchase_orders', read_table(data_dir, 'purchase_orders', fmt=fmt), create=True)
+
+    rows = {}
+    for table in FACT_DIMENSIONS:
+        rows[table] = 0
+        for chunk in read_table_chunks(data_dir, table, fmt, chunk_rows):
+            apply_schema({table: chunk}, categories)
+            for dim, columns in FACT_DIMENSIONS[table].items():
+                denormalize(chunk, dims[dim], ID_COLUMNS[dim], columns)
+            _insert(conn, backend, table, chunk, create=rows[table] == 0)
+            rows[table] += len(chunk)
+        for columns in FACT_INDEXES:
+            conn.execute(f"CREATE INDEX ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})")
+
+    conn.commit()
+    conn.close()
+    os.replace(building, db_path)
+    return rows
+
+
+# ========== DATABASE ==========
+class RetailDatabase:
+    """Read-only handle on a built database, with the small tables loaded in memory.
+
+    Exposes the same ``stores``/``products``/``suppliers``/``purchase_orders``,
+    ``tables`` and ``days`` attributes as ``RetailDataset``, so panels that only
+    use those (and the rollups) work unchanged.
+    """
+
+    def __init__(self, db_path, backend='sqlite'):
+        self.db_path = Path(db_path)
+        self.backend = backend
+        self._conn = connect(db_path, backend, read_only=True)
+        self._lock = threading.Lock()
+
+        tables = {table: self.query(f'SELECT * FROM {table}') for table in SMALL_TABLES}
+        for table, columns in DATE_COLUMNS.items():
+            for col in columns:
+                if table in tables:
+                    tables[table][col] = pd.to_datetime(tables[table][col], format='%Y-%m-%d')
+        apply_schema(tables)
+        for table, df in tables.items():
+            setattr(self, table, df)
+
+        days = self.query('SELECT DISTINCT date FROM inventory ORDER BY date')['date']
+        self.days = np.asarray(days, dtype='datetime64[D]')
+
+    @property
+    def tables(self):
+        return {table: getattr(self, table) for table in SMALL_TABLES}
+
+    def query(self, sql, params=()):
+        """Run ``sql`` with ``?`` parameters and return the result as a DataFrame."""
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError(f"{self.db_path.name} was closed (the database was rebuilt)")
+            cursor = self._conn.execute(sql, list(params))
+            rows = cursor.fetchall()
+            columns = [col[0] for col in cursor.description]
+        return pd.DataFrame(rows, columns=columns)
+
+    def close(self):
+        """Close the connection once running queries finish, releasing the database file."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _iso(day):
+    return pd.Timestamp(day).strftime('%Y-%m-%d')
+
+
+def _in(column, values):
+    return (f"{column} IN ({', '.join('?' * len(values))})", list(values)) if values else ('1 = 0', [])
+
+
+def filter_clause(db, filters):
+    """``WHERE`` condition and parameters restricting a fact table to ``filters``.
+
+    Store selections are resolved to store ids through the bitmap index (store
+    type is not a fact column); product selections match the fact columns.
+    """
+    clauses, params = ['1 = 1'], []
+    if filters.start is not None:
+        clauses.append('date BETWEEN ? AND ?')
+        params += [_iso(filters.start), _iso(filters.end)]
+    store_ids = filter_index(db).store_ids(filters)
+    selections = filters.selected(PRODUCT_FIELDS)
+    if store_ids is not None:
+        selections = {'store_id': store_ids, **selections}
+    for column, values in selections.items():
+        clause, values = _in(column, values)
+        clauses.append(clause)
+        params += values
+    return ' AND '.join(clauses), params
+
+
+def build_sql_rollups(db):
+    """Daily store x department x category rollups aggregated inside the database."""
+    rollups, keys = {}, ', '.join(ROLLUP_KEYS)
+    for table, measures in ROLLUP_MEASURES.items():
+        frame = db.query(
+            f"SELECT {keys}, {', '.join(f'{sql} AS {name}' for name, sql in measures.items())} "
+            f"FROM {table} GROUP BY {keys} ORDER BY {keys}"
+        )
+        frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d')
+        frame['store_id'] = frame['store_id'].astype(db.stores['store_id'].dtype)
+        for col in ('department', 'category'):
+            frame[col] = frame[col].astype(db.products[col].dtype)
+        rollups[table] = Rollup(denormalize(frame, db.stores, 'store_id', ROLLUP_STORE_COLUMNS))
+    return Rollups(**rollups)
+
+
+# ========== PUSHED-DOWN PANELS ==========
+def heatmap(db, rollups, filters):
+    """Latest units on hand pivoted as department x store."""
+    where, params = filter_clause(db, filters)
+    current = db.query(
+        f"SELECT department, store_name, SUM(quantity_on_hand) AS quantity_on_hand FROM inventory "
+        f"WHERE {where} AND date = (SELECT MAX(date) FROM inventory WHERE {where}) "
+        f"GROUP BY department, store_name ORDER BY department, store_name",
+        params * 2
+    )
+    return current.pivot(index='department', columns='store_name', values='quantity_on_hand')
+
+
+def abc_analysis(db, rollups, filters):
+    """Products ranked by revenue with A/B/C classes, plus the per-class summary."""
+    where, params = filter_clause(db, filters)
+    product_revenue = db.query(
+        f"SELECT sku, SUM(revenue) AS revenue FROM sales WHERE {where} GROUP BY sku ORDER BY revenue DESC", params
+    )
+    return classify_abc(product_revenue)
+
+
+def stockout_impact(db, rollups, filters):
+    """Stockout days and estimated lost revenue per store x department.
+
+    Out-of-stock rows come back as is (they are sparse); the trailing revenue
+    of their pairs is aggregated per pair and day inside the database.
+    """
+    where, params = filter_clause(db, filters)
+    stockouts = _dated(_typed_pairs(db, db.query(
+        f"SELECT date, store_id, sku, store_name, department FROM inventory "
+        f"WHERE {where} AND status = 'Out of Stock'", params
+    )))
+    end = _iso(filters.end) if filters.end is not None else None
+    keys = pair_day_keys(db.days, len(db.products), stockouts)
+    return summarize_losses(stockouts, _revenue_index(db, end).lost_revenue(keys))
+
+
+@lru_cache(maxsize=8)
+def _revenue_index(db, end=None):
+    """``RevenueIndex`` over the history up to ``end``, cached per date range end."""
+    bound, params = ('date <= ?', [end]) if end else ('1 = 1', [])
+    stockouts = _dated(_typed_pairs(db, db.query(
+        f"SELECT date, store_id, sku FROM inventory WHERE {bound} AND status = 'Out of Stock'", params
+    )))
+    sales = _dated(_typed_pairs(db, db.query(
+        f"SELECT date, store_id, sku, SUM(revenue) AS revenue FROM sales WHERE {bound} "
+        f"GROUP BY date, store_id, sku", params
+    )))
+    n_skus = len(db.products)
+    return RevenueIndex(db.days, pair_day_keys(db.days, n_skus, stockouts), pair_day_keys(db.days, n_skus, sales),
+                        sales['revenue'].to_numpy('float64'))
+
+
+def reorder_alerts(db, rollups, filters):
+    """Store x SKU pairs whose inventory position is at or below the reorder point on the latest filtered day.
+
+    The database returns the day's on-hand rows and the trailing demand per
+    pair; the reorder engine evaluates them on the dense grid.
+    """
+    engine = reorder_engine(db)
+    day = latest_day(db.days, filters.start, filters.end)
+    first = day - np.timedelta64(DEMAND_WINDOW - 1, 'D')
+    where, params = filter_clause(db, replace(filters, start=None, end=None))
+
+    snapshot = _typed_pairs(db, db.query(
+        f"SELECT store_id, sku, quantity_on_hand FROM inventory WHERE {where} AND date = ?", [*params, _iso(day)]
+    ))
+    demand = _typed_pairs(db, db.query(
+        f"SELECT store_id, sku, SUM(quantity_sold) AS sold FROM inventory "
+        f"WHERE {where} AND date BETWEEN ? AND ? GROUP BY store_id, sku", [*params, _iso(first), _iso(day)]
+    ))
+    window_days = max(1, int(((db.days >= first) & (db.days <= day)).sum()))
+    sold = engine.matrix(engine.pair_codes(demand['store_id'], demand['sku']), demand['sold'].to_numpy('float64'))
+
+    state = engine.evaluate(day, snapshot, sold / window_days)
+    index = filter_index(db)
+    return engine.alerts(state, index.stores(filters), index.products(filters))
+
+
+def _typed_pairs(db, df):
+    """Cast queried ``store_id``/``sku`` text back to the shared id categoricals."""
+    df['store_id'] = df['store_id'].astype(db.stores['store_id'].dtype)
+    df['sku'] = df['sku'].astype(db.products['sku'].dtype)
+    return df
+
+
+class SqlHistory:
+    """``retail_forecast`` history served by the database, one query per range of stores."""
+
+    def __init__(self, db):
+        self.db = db
+        self.days = db.days
+        self.rows = int(db.query('SELECT COUNT(*) AS n FROM inventory')['n'].iloc[0])
+        self.shape = (len(db.stores), len(db.products))
+
+    def digest(self):
+        """Path, size and modification time of the database file (rebuilt whenever the data changes)."""
+        stat = self.db.db_path.stat()
+        return f'{self.db.db_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def monthly_totals(self):
+        """``(12, skus)`` units sold and row counts per month of year and SKU."""
+        totals = self.db.query(
+            "SELECT CAST(substr(date, 6, 2) AS INTEGER) AS month, sku, "
+            "SUM(quantity_sold) AS sold, COUNT(*) AS n FROM inventory GROUP BY month, sku"
+        )
+        skus = totals['sku'].astype(self.db.products['sku'].dtype).cat.codes.to_numpy()
+        keys = (totals['month'].to_numpy('int64') - 1) * self.shape[1] + skus
+        sold = np.bincount(keys, weights=totals['sold'].to_numpy('float64'), minlength=12 * self.shape[1])
+        rows = np.bincount(keys, weights=totals['n'].to_numpy('float64'), minlength=12 * self.shape[1])
+        return sold.reshape(12, -1), rows.reshape(12, -1)
+
+    def chunks(self, store_ranges):
+        """Yield ``(day_idx, sku_idx, store_idx - lo, quantity_sold)`` for each ``(lo, hi)`` store range."""
+        store_ids = self.db.stores['store_id'].cat.categories
+        for lo, hi in store_ranges:
+            rows = _typed_pairs(self.db, self.db.query(
+                f"SELECT date, store_id, sku, quantity_sold FROM inventory "
+                f"WHERE store_id IN ({', '.join('?' * (hi - lo))}) ORDER BY date",
+                [str(store_id) for store_id in store_ids[lo:hi]]
+            ))
+            days = pd.to_datetime(rows['date'], format='%Y-%m-%d').to_numpy('datetime64[D]')
+            yield (np.searchsorted(self.days, days).astype(np.int32), rows['sku'].cat.codes.to_numpy(),
+                   rows['store_id'].cat.codes.to_numpy() - lo, rows['quantity_sold'].to_numpy('float32'))
+
+
+@lru_cache(maxsize=2)
+def database_stockouts(db):
+    """Projected stockouts as of the database's last day, computed once per opened database."""
+    day = db.days[-1]
+    snapshot = _typed_pairs(db, db.query(
+        "SELECT store_id, sku, quantity_on_hand FROM inventory WHERE date = ?", [_iso(day)]
+    ))
+    forecast = cached_forecast(SqlHistory(db), db.products, db.db_path.parent)
+    return projected_stockouts(forecast, reorder_engine(db), snapshot)
+
+
+def stockout_forecast(db, rollups, filters):
+    """Store x SKU pairs forecast to run out of stock within ``HORIZON`` days of the last data day."""
+    return at_risk(database_stockouts(db), filter_index(db), filters)
+
+
+def _dated(df):
+    """Parse a queried ISO ``date`` column."""
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    return df
+
+
+def daily_sales(db, rollups, filters):
+    """Revenue, profit and transaction count per day."""
+    where, params = filter_clause(db, filters)
+    daily = db.query(
+        f'SELECT date AS "Date", SUM(revenue) AS "Revenue", SUM(profit) AS "Profit", '
+        f'COUNT(transaction_id) AS "Transactions" FROM sales WHERE {where} GROUP BY date ORDER BY date',
+        params
+    )
+    daily['Date'] = pd.to_datetime(daily['Date'], format='%Y-%m-%d')
+    return daily
+
+
+# Panel registry for the SQL backend: the rest read only rollups and small tables
+SQL_PANELS = {
+    **PANELS,
+    'heatmap': heatmap,
+    'abc': abc_analysis,
+    'stockout': stockout_impact,
+    'reorder': reorder_alerts,
+    'forecast': stockout_forecast,
+    'trends': daily_sales
+}
+
+# Results memoized per database object, cleared when the file is rebuilt
+SQL_DATASET_CACHES = (*DATASET_CACHES, _revenue_index, database_stockouts)
+
+
+class DatabaseLoader:
+    """``IncrementalLoader`` counterpart for a database file: reopened whenever the file is rebuilt."""
+
+    def __init__(self, db_path, backend='sqlite'):
+        self.db_path = Path(db_path)
+        self.backend = backend
+        self.version = 0
+        self.last_change = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _signature(self):
+        stat = self.db_path.stat()
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        previous = getattr(self, '_state', None)
+        # DuckDB hands out the instance already open for a path, which would
+        # still be the replaced file, so its old handle is closed first
+        if previous is not None and self.backend == 'duckdb':
+            previous[1].close()
+        self._seen = self._signature()
+        db = RetailDatabase(self.db_path, self.backend)
+        self.version += 1
+        self.last_change = f'opened {self.db_path.name}'
+        self._state = (self.version, db, build_sql_rollups(db))
+        # Release the replaced file now rather than whenever the old handle is collected
+        if previous is not None:
+            previous[1].close()
+
+    def refresh(self):
+        """Reopen the database if its file was replaced; returns True if a new version was published."""
+        with self._lock:
+            if self._signature() == self._seen:
+                return False
+            self._load()
+            return True
+
+    def snapshot(self):
+        return self._state
+
+    @property
+    def dataset(self):
+        return self._state[1]
+
+    @property
+    def rollups(self):
+        return self._state[2]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the embedded database used by the SQL dashboard backend.")
+    parser.add_argument('--data-dir', default='.', help="directory holding the generated tables (default: .)")
+    parser.add_argument('--db', help="database file to create (default: retail.<backend> in --data-dir)")
+    parser.add_argument('--backend', choices=BACKENDS, default='sqlite', help="database engine (default: sqlite)")
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000,
+                        help="CSV rows inserted per batch (default: 1,000,000)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_path = Path(args.db or Path(args.data_dir) / f'retail.{args.backend}')
+
+    started = time.perf_counter()
+    rows = build_database(args.data_dir, db_path, args.backend, chunk_rows=args.chunk_rows)
+    print(f"Built {db_path} ({args.backend}) in {time.perf_counter() - started:.1f}s: "
+          f"{rows['inventory']:,} inventory rows, {rows['sales']:,} sales rows, "
+          f"{db_path.stat().st_size / 1024 ** 2:,.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Lost revenue of stockouts, estimated per store x SKU.
+
+Each out-of-stock day of a pair is valued at that pair's average daily
+revenue over the ``LOSS_WINDOW`` days before it, counting only the days it
+was in stock so earlier stockouts don't drag the rate down. A pair with no
+in-stock day in the window falls back to its average over all earlier
+in-stock days.
+
+Revenue and stockouts are laid out on sorted ``pair * n_days + day`` keys
+with a running revenue total, so the window sums of any number of stockout
+days are two ``searchsorted`` lookups each, with no per-pair loop. Rows dated
+outside the inventory days (e.g. sales landed ahead of that day's inventory)
+or with unknown ids have no key and are left out, rather than spilling into
+the next pair's range.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# Trailing days whose revenue prices a stockout day
+LOSS_WINDOW = 28
+
+
+def pair_day_keys(days, n_skus, rows):
+    """``pair * len(days) + day position`` of each row's (store_id, sku, date); -1 off the grid.
+
+    Rows whose date is not one of ``days`` or whose store or SKU is unknown
+    (code -1) get key -1.
+    """
+    stores, skus = rows['store_id'].cat.codes.to_numpy('int64'), rows['sku'].cat.codes.to_numpy('int64')
+    dates = rows['date'].to_numpy('datetime64[D]')
+    position = np.searchsorted(days, dates)
+    valid = (position < len(days)) & (stores >= 0) & (skus >= 0)
+    valid[valid] = days[position[valid]] == dates[valid]
+    return np.where(valid, (stores * n_skus + skus) * len(days) + position, -1)
+
+
+class RevenueIndex:
+    """Running revenue and stockout counts per store x SKU, for window sums by key range."""
+
+    def __init__(self, days, stockout_keys, sale_keys, sale_revenue):
+        self.days = days
+        # Off-grid rows (key -1) are dropped so they can't land in a pair's range
+        on_grid = sale_keys >= 0
+        sale_keys, sale_revenue = sale_keys[on_grid], sale_revenue[on_grid]
+        self._stockouts = np.sort(stockout_keys[stockout_keys >= 0])
+        order = np.argsort(sale_keys, kind='stable')
+        self._sale_keys = sale_keys[order]
+        self._revenue = np.concatenate([[0.0], np.cumsum(sale_revenue[order])])
+
+    def _window(self, base, first, day):
+        """Revenue per in-stock day between ``first`` and ``day`` (exclusive); NaN with no in-stock day."""
+        lo, hi = base + first, base + day
+        revenue = self._revenue[np.searchsorted(self._sale_keys, hi)] - self._revenue[np.searchsorted(self._sale_keys, lo)]
+        in_stock = (day - first) - (np.searchsorted(self._stockouts, hi) - np.searchsorted(self._stockouts, lo))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(in_stock > 0, revenue / in_stock, np.nan)
+
+    def lost_revenue(self, keys, window=LOSS_WINDOW):
+        """Estimated revenue lost on each out-of-stock ``pair_day_keys`` key."""
+        n_days = len(self.days)
+        base, day = keys - keys % n_days, keys % n_days
+        first = np.searchsorted(self.days, self.days[day] - np.timedelta64(window, 'D'))
+        rate = self._window(base, first, day)
+        missing = np.isnan(rate)
+        rate[missing] = self._window(base[missing], 0, day[missing])
+        return np.nan_to_num(rate)
+
+
+@lru_cache(maxsize=2)
+def revenue_index(data):
+    """``RevenueIndex`` over the whole history of an in-memory dataset, built once per object."""
+    inventory, n_skus = data.inventory, len(data.products)
+    stockouts = inventory[inventory['status'] == 'Out of Stock']
+    return RevenueIndex(data.days, pair_day_keys(data.days, n_skus, stockouts),
+                        pair_day_keys(data.days, n_skus, data.sales), data.sales['revenue'].to_numpy('float64'))
+
+
+def summarize_losses(stockouts, lost):
+    """Stockout days and estimated lost revenue per store x department, from out-of-stock rows."""
+    stockout_analysis = stockouts[['store_name', 'department']].assign(stockout_days=1, estimated_lost_revenue=lost)
+    return stockout_analysis.groupby(['store_name', 'department'], observed=True)[
+        ['stockout_days', 'estimated_lost_revenue']].sum().reset_index()
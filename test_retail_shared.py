@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Regression tests for datasets shared through memory-mapped snapshots."""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from retail_ingest import IncrementalLoader
+from retail_shared import SharedTables
+
+SAMPLE_DIR = Path(__file__).parent
+
+
+def test_empty_sales_table_shared_then_appended(tmp_path):
+    """An empty fact table keeps its categorical ids through a snapshot, so a later append still ingests."""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for source in SAMPLE_DIR.glob('retail_*.csv'):
+        shutil.copy(source, data_dir)
+    sales_lines = (data_dir / 'retail_sales.csv').read_text().splitlines(keepends=True)
+    (data_dir / 'retail_sales.csv').write_text(sales_lines[0])
+
+    loader = IncrementalLoader(data_dir, shared=SharedTables(tmp_path / 'shared'))
+    assert len(loader.dataset.sales) == 0
+    assert isinstance(loader.dataset.sales['store_id'].dtype, pd.CategoricalDtype)
+    assert len(loader.dataset.sales['store_id'].cat.categories) == len(loader.dataset.stores)
+
+    with open(data_dir / 'retail_sales.csv', 'a') as f:
+        f.writelines(sales_lines[1:101])
+    assert loader.refresh()
+
+    private = IncrementalLoader(data_dir)
+    pd.testing.assert_frame_equal(loader.dataset.sales, private.dataset.sales)